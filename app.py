@@ -1,149 +1,474 @@
+import time
+_import_started = time.perf_counter()
 import os
-import io
-import stripe
-from flask import Flask, send_file, request, jsonify, redirect
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
+import gzip
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from flask import Flask, send_file, request, jsonify, redirect, Response, abort, g
+from scoring import (JDI8_ITEMS, RISK_TABLE, SCORE_TABLE, MAX_BULK_RESPONDENTS, score_answers, pack_answers,
+                     pack_cohort, score_cohort, iter_ndjson, format_answers, parse_answers)
+from protocols import select_protocol
+import bulk_reports
+import fulfillment
+import jobs
+import metrics
+
+try:
+    import brotli
+except ImportError:  # optional: pages are served gzip-only without it
+    brotli = None
 
 app = Flask(__name__)
 
 # --- COMMERCIAL GATEKEEPING ---
-# Set to True for Stripe Review. Set to False for local testing.
-COMMERCIAL_READY = True 
-
-stripe.api_key = os.environ.get("STRIPE_SECRET_KEY", "sk_test_placeholder")
-
-# --- 1. PREMIUM PDF ENGINE (Ryo Sakuma Design) ---
-def create_report(score):
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=A4)
-    width, height = A4
-
-    # --- PAGE 1: BIOMETRIC ARCHITECTURE ---
-    p.setFillColor(colors.black)
-    p.rect(0, 0, width, height, fill=1)
-    
-    p.setFont("Helvetica-Bold", 12)
-    p.setFillColor(colors.HexColor("#39FF14"))
-    p.drawString(50, height - 50, "OFFICIAL LONGEVITY BLUEPRINT // ZENGEN AI")
-    
-    # Biometric Score Circle
-    p.setStrokeColor(colors.HexColor("#39FF14"))
-    p.setLineWidth(4)
-    p.circle(width/2, height - 170, 85, stroke=1, fill=0)
-    p.setFont("Helvetica-Bold", 55)
-    p.setFillColor(colors.white)
-    p.drawCentredString(width/2, height - 190, f"{score}/8")
-    
-    p.setFont("Helvetica-Bold", 14)
-    p.setFillColor(colors.HexColor("#39FF14"))
-    p.drawCentredString(width/2, height - 280, "JDI8 BIOMETRIC SCORE")
-    
-    # Dynamic Risk Assessment based on score
-    risk = "HIGH" if score <= 3 else "MODERATE" if score <= 6 else "LOW"
-    p.setFont("Helvetica-Bold", 18)
-    p.setFillColor(colors.white)
-    p.drawCentredString(width/2, height - 320, f"RISK ASSESSMENT: {risk}")
-
-    p.setStrokeColor(colors.HexColor("#333333"))
-    p.line(50, height - 350, width - 50, height - 350)
-
-    # Scientific Foundation
-    p.setFont("Helvetica-Bold", 14)
-    p.setFillColor(colors.HexColor("#39FF14"))
-    p.drawString(50, height - 390, "02 // SCIENTIFIC FOUNDATION")
-    p.setFont("Helvetica", 11)
-    p.setFillColor(colors.white)
-    p.drawString(50, height - 415, "Source: Nature (2010). Human gut bacterial metabolism of red seaweed.")
-    p.drawString(50, height - 430, "Porphyranase enzyme pathway specialized for marine polysaccharide processing.")
-
-    # 7-Day Protocol Table (Lowered to avoid overlap with Header 03)
-    p.setFont("Helvetica-Bold", 14)
-    p.setFillColor(colors.HexColor("#39FF14"))
-    p.drawString(50, height - 480, "03 // 7-DAY PERSONALIZED PROTOCOL")
-
-    data = [["Day", "Focus", "Action Plan"]]
-    if score <= 4:
-        rows = [
-            ["Mon", "Autophagy", "Strict 16:8 Fasting. Start with Miso soup."],
-            ["Tue", "Microbiome", "High-density Natto intake for mucosal support."],
-            ["Wed", "Enzyme", "Red seaweed integration. Activate Porphyranase."],
-            ["Thu", "Recovery", "2g Premium Ippodo Matcha. Prioritize L-Theanine."],
-            ["Fri", "Omega-3", "1g EPA/DHA. Optimize inflammation control."],
-            ["Sat", "Metabolism", "HIIT Session (20min). Activate cellular glycolysis."],
-            ["Sun", "Rest", "Hot soak (42C) followed by 2min cold exposure."]
-        ]
-    else:
-        rows = [
-            ["Mon", "Reset", "Autophagy initiation. Miso & Seaweed protocol."],
-            ["Tue", "Diversity", "Mix Natto with fermented fibers (Kimchi/Okra)."],
-            ["Wed", "Catalyst", "Seaweed salad. Maximize marine polysaccharide conversion."],
-            ["Thu", "Nootropic", "3g Ippodo Matcha. Focus on cognitive NAD+ repair."],
-            ["Fri", "Lipids", "Wild-caught fatty fish + EPA supplement."],
-            ["Sat", "Vascular", "Zone 2 Cardio (45min). Mitochondrial biogenesis."],
-            ["Sun", "Homeostasis", "Deep tissue recovery + Magnesium-rich bath."]
-        ]
-    for r in rows: data.append(r)
-
-    # Increased rowHeights to 35 to fill space and adjusted drawOn Y
-    table = Table(data, colWidths=[60, 90, 340], rowHeights=35)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1A1A1A")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#39FF14")),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#333333")),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.white),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    table.wrapOn(p, 50, 420)
-    table.drawOn(p, 50, height - 780)
-
-    # --- PAGE 2: THE GOLD STANDARD STACK ---
-    p.showPage()
-    p.setFillColor(colors.black)
-    p.rect(0, 0, width, height, fill=1)
-    p.setFont("Helvetica-Bold", 16)
-    p.setFillColor(colors.HexColor("#39FF14"))
-    p.drawString(50, height - 60, "04 // THE GOLD STANDARD STACK")
-
-    stacks = [
-        ("Ippodo Matcha", "Highest concentration of L-Theanine for neuroprotection.", "https://amzn.to/3ZgMv0Q"),
-        ("Suntory NMN", "NAD+ precursor. 99.9% purity for cellular DNA repair.", "https://amzn.to/4qTcOHM"),
-        ("Spermidine", "Natural polyamine that triggers cellular autophagy.", "https://amzn.to/4tYE6j2"),
-        ("High-Dose EPA/DHA", "Advanced inflammation and cardiovascular control.", "https://amzn.to/4kRTklz"),
-        ("Zojirushi IH Engine", "Standard for consistent glycaemic index control.", "https://amzn.to/4hfC1sA")
-    ]
-    
-    y = height - 150
-    for title, desc, link in stacks:
-        p.setStrokeColor(colors.HexColor("#222222"))
-        p.rect(50, y - 60, width - 100, 80, stroke=1, fill=0)
-        p.setFont("Helvetica-Bold", 13)
-        p.setFillColor(colors.white)
-        p.drawString(65, y, f"> {title}")
-        p.setFont("Helvetica", 10)
-        p.setFillColor(colors.lightgrey)
-        p.drawString(65, y - 20, desc)
-        p.setFont("Helvetica-Oblique", 9)
-        p.setFillColor(colors.HexColor("#39FF14"))
-        p.drawString(65, y - 45, f"Purchase via Amazon: {link}")
-        y -= 100
-    
-    # Identifies developer as Ryo Sakuma
-    p.setFont("Helvetica", 8)
-    p.setFillColor(colors.HexColor("#444444"))
-    p.drawCentredString(width/2, 40, "DEVELOPED BY RYO SAKUMA // HOKKAIDO UNIVERSITY // ADVICE ONLY") 
-    p.save()
-    buffer.seek(0)
-    return buffer
+# Set to True for Stripe Review. Set to False (or COMMERCIAL_READY=0) for local testing; only then are the
+# query-string /download-report and legacy /success links served.
+COMMERCIAL_READY = os.environ.get("COMMERCIAL_READY", "1") != "0"
+
+# --- STRIPE HTTP CLIENT ---
+# Keep-alive requests sessions (one per worker thread) with strict connect/read timeouts, so a slow
+# Stripe response fails fast instead of holding a worker. STRIPE_API_BASE points at stripe_stub.py offline.
+# The stripe package is imported on first checkout (or in warm_up()), not at module load.
+STRIPE_CONNECT_TIMEOUT = float(os.environ.get("STRIPE_CONNECT_TIMEOUT", 3))
+STRIPE_READ_TIMEOUT = float(os.environ.get("STRIPE_READ_TIMEOUT", 10))
+_stripe = None
+
+def get_stripe():
+    global _stripe
+    if _stripe is None:
+        import stripe
+        stripe.api_key = os.environ.get("STRIPE_SECRET_KEY", "sk_test_placeholder")
+        stripe.max_network_retries = int(os.environ.get("STRIPE_MAX_RETRIES", 1))
+        stripe.default_http_client = stripe.RequestsClient(timeout=(STRIPE_CONNECT_TIMEOUT, STRIPE_READ_TIMEOUT))
+        if os.environ.get("STRIPE_API_BASE"):
+            stripe.api_base = os.environ["STRIPE_API_BASE"]
+        _stripe = stripe
+    return _stripe
+
+# --- REPORT CACHE SETTINGS ---
+# Bump REPORT_VERSION whenever the PDF layout or copy changes so cached files are rebuilt.
+REPORT_VERSION = "3"
+REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR")
+MAX_SCORE = 8
+# Output profiles (report.PROFILES): PDFs for download, page 1 previews (image/<name>) for the results screen/email
+PDF_PROFILES = ('standard', 'compact')
+PREVIEW_PROFILES = ('png', 'webp')
+REPORT_CHUNK_SIZE = 64 * 1024
+
+# --- RENDER POOL SETTINGS ---
+# Cache-miss renders run in a small process pool so ReportLab never ties up the request thread.
+# RENDER_WORKERS=0 renders on the request thread instead (local development).
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 2))
+RENDER_QUEUE_DEPTH = int(os.environ.get("RENDER_QUEUE_DEPTH", 8))
+RENDER_TIMEOUT = float(os.environ.get("RENDER_TIMEOUT", 20))
+RENDER_RETRY_AFTER = int(os.environ.get("RENDER_RETRY_AFTER", 5))
+
+# --- METRICS ---
+metrics.describe('http_request_duration_seconds', 'histogram', "Request latency by route, method and status.")
+metrics.describe('http_requests_in_flight', 'gauge', "Requests currently being handled, by route.")
+metrics.describe('report_render_phase_seconds', 'histogram', "create_report time per phase (page1, table, page2, save).")
+metrics.describe('report_cache_lookups_total', 'counter', "Report cache lookups by result (hit/miss).")
+metrics.describe('report_render_rejected_total', 'counter', "Renders refused by admission control (503).")
+metrics.describe('stripe_request_duration_seconds', 'histogram', "Stripe API call latency by operation and outcome.")
+metrics.describe('stripe_errors_total', 'counter', "Stripe API errors by exception type.")
+metrics.describe('report_fulfillments_total', 'counter', "Paid reports stored for download, by trigger (webhook/success/download).")
+metrics.describe('paid_report_downloads_total', 'counter', "Signed-link downloads by result (ready/waited/unpaid).")
+metrics.describe('report_jobs_total', 'counter', "Report jobs by outcome (queued/rejected/done/failed/requeued).")
+metrics.describe('report_job_wait_seconds', 'histogram', "Time report jobs spend queued before a runner claims them.")
+
+# --- 1. PREMIUM PDF ENGINE ---
+# The ReportLab renderer lives in report.py and is imported on first use, so workers that only serve
+# pages never pay for ReportLab (see warm_up() for the pre-fork path that loads it up front).
+def create_report(score, answers=None, buffer=None, profile='standard'):
+    from report import create_report as render
+    return render(score, answers, buffer, profile)
+
+# --- 1b. REPORT CACHE (score / answer vector / profile -> rendered bytes) ---
+# The report only depends on the score (0-8) or the 8-bit answer vector, so every variant is rendered once and reused.
+# Each output profile (standard/compact PDF, png/webp preview) is cached separately; previews only vary by score.
+_report_cache = {}
+
+def parse_score(raw):
+    # Rejects anything that is not a plain integer in 0..MAX_SCORE before it reaches the renderer
+    raw = str(raw).strip()
+    if not (raw.isascii() and raw.isdigit()):
+        return None
+    score = int(raw)
+    return score if score <= MAX_SCORE else None
+
+def _report_cache_path(score, answers, profile='standard'):
+    variant = f"s{score}" if answers is None else f"a{format_answers(answers)}"
+    suffix = '' if profile == 'standard' else f"_{profile}"
+    return os.path.join(REPORT_CACHE_DIR, f"report_v{REPORT_VERSION}_{variant}{suffix}.{'pdf' if profile in PDF_PROFILES else profile}")
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(REPORT_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+def _render_pdf(score, answers=None, profile='standard'):
+    # Module-level so the process pool can pickle it by reference
+    from report import render_profile
+    return render_profile(score, answers, profile)
+
+# --- 1c. RENDER POOL (admission control + single-flight) ---
+class RenderQueueFull(Exception):
+    pass
+
+_render_pool = None
+_render_pool_pid = None
+_render_lock = threading.Lock()
+_inflight_renders = {}
+
+def _render_pool_context():
+    # The pool is created lazily inside threaded (gthread) workers, where a plain fork can copy a lock some other
+    # thread holds. Render processes are forked from a single-threaded forkserver instead, preloaded with
+    # ReportLab and this module so each one starts warm.
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return None
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['report', __name__])
+    return context
+
+def _get_render_pool():
+    # Created lazily and per process, so it is never inherited across a gunicorn fork
+    global _render_pool, _render_pool_pid
+    if _render_pool is None or _render_pool_pid != os.getpid():
+        context = _render_pool_context()
+        _render_pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS, mp_context=context)
+        _render_pool_pid = os.getpid()
+    return _render_pool
+
+def _finish_render(key, future):
+    with _render_lock:
+        if _inflight_renders.get(key, (None,))[0] is future:
+            del _inflight_renders[key]
+
+def _reset_render_pool(pool):
+    # Call with _render_lock held. A render process died (OOM kill, segfault), which breaks the executor for good:
+    # drop it and the renders it owned so the next submit builds a fresh pool.
+    global _render_pool
+    if _render_pool is pool:
+        _render_pool = None
+        for key in [key for key, (_, owner) in _inflight_renders.items() if owner is pool]:
+            del _inflight_renders[key]
+        pool.shutdown(wait=False)
+
+def render_report(score, answers=None, profile='standard'):
+    # Identical concurrent requests share one render; distinct renders beyond RENDER_QUEUE_DEPTH are refused.
+    # A broken pool is replaced and the render retried once before the client gets a 503.
+    if RENDER_WORKERS <= 0:
+        return _render_pdf(score, answers, profile)
+    key = (score, answers, profile)
+    for _ in range(2):
+        with _render_lock:
+            future, pool = _inflight_renders.get(key, (None, None))
+            if future is None:
+                if len(_inflight_renders) >= RENDER_QUEUE_DEPTH:
+                    metrics.inc('report_render_rejected_total', reason='queue_full')
+                    raise RenderQueueFull()
+                pool = _get_render_pool()
+                try:
+                    future = pool.submit(_render_pdf, score, answers, profile)
+                except BrokenProcessPool:
+                    _reset_render_pool(pool)
+                    continue
+                _inflight_renders[key] = (future, pool)
+        future.add_done_callback(lambda f: _finish_render(key, f))
+        try:
+            return future.result(timeout=RENDER_TIMEOUT)
+        except FutureTimeoutError:
+            metrics.inc('report_render_rejected_total', reason='timeout')
+            raise RenderQueueFull()
+        except BrokenProcessPool:
+            with _render_lock:
+                _reset_render_pool(pool)
+    metrics.inc('report_render_rejected_total', reason='pool_broken')
+    raise RenderQueueFull()
+
+def _report_entry(score, answers=None, render=_render_pdf, profile='standard'):
+    # Returns (data, etag, path). Disk-backed entries keep only the path, so workers stream the
+    # file (sendfile where the server supports it) instead of each holding a copy of every PDF.
+    # render: callable(score, answers, profile) -> bytes; the request path passes render_report.
+    if answers is not None:
+        score = SCORE_TABLE[answers]
+        if profile in PREVIEW_PROFILES:
+            answers = None
+    key = (REPORT_VERSION, score, answers, profile)
+    cached = _report_cache.get(key)
+    if cached is not None:
+        metrics.inc('report_cache_lookups_total', result='hit')
+        return cached
+
+    metrics.inc('report_cache_lookups_total', result='miss')
+    entry = None
+    if REPORT_CACHE_DIR:
+        path = _report_cache_path(score, answers, profile)
+        try:
+            if os.path.exists(path):
+                etag = _hash_file(path)
+            else:
+                os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+                data = render(score, answers, profile)
+                # Per-thread tmp name: single-flight hands the same bytes to every waiting thread at once
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                etag = hashlib.sha256(data).hexdigest()[:32]
+            entry = (None, etag, path)
+        except OSError:
+            entry = None
+    if entry is None:
+        data = render(score, answers, profile)
+        entry = (data, hashlib.sha256(data).hexdigest()[:32], None)
+
+    _report_cache[key] = entry
+    return entry
+
+def get_report(score, answers=None, profile='standard'):
+    data, etag, path = _report_entry(score, answers, profile=profile)
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    return data, etag
+
+def warm_report_cache(profiles=PDF_PROFILES + PREVIEW_PROFILES):
+    for profile in profiles:
+        for score in range(MAX_SCORE + 1):
+            _report_entry(score, profile=profile)
+        if profile in PDF_PROFILES:
+            for answers in range(256):
+                _report_entry(None, answers, profile=profile)
+
+# --- 1d. PRECOMPILED RESPONSES ---
+# Pages and assets are rendered once, compressed once (gzip + brotli) and then served from memory with
+# content negotiation and ETags. Assets get content-hashed URLs so they can be cached forever.
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+PAGE_CACHE_CONTROL = 'public, max-age=300'
+COMPRESS_MIN_SIZE = 256
+
+_assets = {}
+_asset_urls = {}
+_compiled_pages = {}
+
+def compile_response(body, mimetype, cache_control):
+    # Returns {'mimetype', 'cache_control', 'variants': {encoding: (bytes, etag)}}; '' is the identity encoding
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    etag = hashlib.sha256(body).hexdigest()[:20]
+    variants = {'': (body, etag)}
+    if len(body) >= COMPRESS_MIN_SIZE:
+        variants['gzip'] = (gzip.compress(body, compresslevel=9, mtime=0), etag + '-gz')
+        if brotli is not None:
+            variants['br'] = (brotli.compress(body, quality=11), etag + '-br')
+    return {'mimetype': mimetype, 'cache_control': cache_control, 'variants': variants}
+
+def serve_compiled(compiled):
+    variants = compiled['variants']
+    encoding = ''
+    for candidate in ('br', 'gzip'):
+        if candidate in variants and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+    body, etag = variants[encoding]
+    response = Response(body, mimetype=compiled['mimetype'])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if len(variants) > 1:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = compiled['cache_control']
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+def asset_url(path):
+    # 'css/zengen.css' -> '/assets/zengen.<hash>.css', compiling the file on first use
+    url = _asset_urls.get(path)
+    if url is None:
+        with open(os.path.join(STATIC_DIR, path), 'rb') as f:
+            body = f.read()
+        stem, ext = os.path.splitext(os.path.basename(path))
+        name = f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+        mimetype = {'.css': 'text/css', '.js': 'text/javascript'}.get(ext, 'application/octet-stream')
+        _assets[name] = compile_response(body, mimetype, ASSET_CACHE_CONTROL)
+        url = _asset_urls[path] = f"/assets/{name}"
+    return url
+
+def compiled_page(key, build, cache_control=PAGE_CACHE_CONTROL):
+    compiled = _compiled_pages.get(key)
+    if compiled is None:
+        compiled = _compiled_pages[key] = compile_response(build(), 'text/html', cache_control)
+    return compiled
+
+def compile_assets():
+    # Every file under static/, so a hashed URL resolves even in a process that has not rendered a page yet
+    for directory, _, files in os.walk(STATIC_DIR):
+        for filename in files:
+            asset_url(os.path.relpath(os.path.join(directory, filename), STATIC_DIR))
+
+@app.route('/assets/<name>')
+def asset(name):
+    compiled = _assets.get(name)
+    if compiled is None:
+        compile_assets()
+        compiled = _assets.get(name)
+    if compiled is None:
+        abort(404)
+    return serve_compiled(compiled)
+
+def warm_page_cache():
+    compiled_page(('home', COMMERCIAL_READY), _build_home)
+    compiled_page('about', _build_about)
+    compiled_page('legal', _build_legal)
+
+# --- 1e. REQUEST INSTRUMENTATION ---
+def _route_label():
+    return request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+
+@app.before_request
+def _start_request_timer():
+    if request.path != '/metrics':
+        g.request_started = time.perf_counter()
+        metrics.gauge_add('http_requests_in_flight', 1, route=_route_label())
+
+@app.after_request
+def _record_request(response):
+    started = g.get('request_started')
+    if started is not None:
+        metrics.observe('http_request_duration_seconds', time.perf_counter() - started,
+                        route=_route_label(), method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def _finish_request(exc):
+    if g.pop('request_started', None) is not None:
+        metrics.gauge_add('http_requests_in_flight', -1, route=_route_label())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # Prometheus exposition format, aggregated over every worker that shares METRICS_DIR
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+# --- 1f. PAID REPORT FULFILLMENT (webhook -> background render -> signed download) ---
+# checkout.session.completed starts rendering the buyer's report as soon as payment settles; the success page
+# links to it with a signed, expiring token. STRIPE_WEBHOOK_SECRET enables the webhook endpoint and
+# FULFILLMENT_ACCEL_PREFIX (e.g. "/protected-reports/", an nginx internal location aliased to FULFILLMENT_DIR)
+# hands the file transfer to nginx via X-Accel-Redirect instead of sendfile from the worker.
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+FULFILLMENT_ACCEL_PREFIX = os.environ.get("FULFILLMENT_ACCEL_PREFIX")
+FULFILLMENT_THREADS = int(os.environ.get("FULFILLMENT_THREADS", 2))
+
+fulfillment_store = fulfillment.BlobStore()
+_fulfillment_pool = None
+_fulfillment_pool_pid = None
+_fulfillment_lock = threading.Lock()
+_inflight_fulfillments = {}
+
+def report_args(metadata):
+    # Checkout session metadata written by create_checkout_session -> (score, answers), or None
+    metadata = metadata or {}
+    answers = parse_answers(metadata.get('answers', ''))
+    if answers is not None:
+        return SCORE_TABLE[answers], answers
+    score = parse_score(metadata.get('score', ''))
+    return None if score is None else (score, None)
+
+def fulfill(session_id, score, answers=None, trigger='webhook'):
+    # Renders through the report cache and render pool, then stores the PDF under the session id
+    path = fulfillment_store.lookup(session_id)
+    if path is None:
+        data, _, cached_path = _report_entry(score, answers, render=render_report)
+        if data is None:
+            with open(cached_path, 'rb') as f:
+                data = f.read()
+        path = fulfillment_store.put(session_id, data)
+        metrics.inc('report_fulfillments_total', trigger=trigger)
+    return path
+
+def _get_fulfillment_pool():
+    global _fulfillment_pool, _fulfillment_pool_pid
+    if _fulfillment_pool is None or _fulfillment_pool_pid != os.getpid():
+        _fulfillment_pool = ThreadPoolExecutor(max_workers=FULFILLMENT_THREADS, thread_name_prefix='fulfillment')
+        _fulfillment_pool_pid = os.getpid()
+    return _fulfillment_pool
+
+def _finish_fulfillment(session_id, future):
+    with _fulfillment_lock:
+        if _inflight_fulfillments.get(session_id) is future:
+            del _inflight_fulfillments[session_id]
+    if future.exception() is not None:
+        # The download route renders on demand if the background attempt failed
+        app.logger.warning("Background fulfillment of %s failed: %r", session_id, future.exception())
+
+def start_fulfillment(session_id, score, answers=None, trigger='webhook'):
+    # Single-flight per session: webhook retries and an early download share one background render
+    with _fulfillment_lock:
+        future = _inflight_fulfillments.get(session_id)
+        started = future is None
+        if started:
+            future = _get_fulfillment_pool().submit(fulfill, session_id, score, answers, trigger)
+            _inflight_fulfillments[session_id] = future
+    if started:
+        # Outside the lock: a future that is already done runs the callback on this thread
+        future.add_done_callback(lambda f: _finish_fulfillment(session_id, f))
+    return future
+
+# --- 1g. REPORT JOBS (POST /api/reports -> poll status -> fetch result) ---
+# Long-running or personalized renders are queued instead of holding a request open: the job queue lives in
+# JOBS_DIR (see jobs.py), runner threads in each worker render through the report cache and render pool, and
+# a saturated pool puts the job back in the queue rather than failing it. Beyond JOB_QUEUE_LIMIT waiting jobs,
+# new submissions get 503 + Retry-After.
+report_jobs = jobs.JobQueue()
+
+def _run_report_job(job):
+    data, _, path = _report_entry(job['score'], job['answers'], render=render_report, profile=job['profile'])
+    if data is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    return data
+
+job_runner = jobs.JobRunner(report_jobs, _run_report_job, retry_on=(RenderQueueFull,))
+
+def job_args(body):
+    # {"answers": "<8 x 0/1>" | {JDI8 answers}} or {"score": 0-8} -> (score, answers); ValueError otherwise
+    if 'answers' in body:
+        raw = body['answers']
+        answers = parse_answers(raw) if isinstance(raw, str) else pack_answers(raw)
+        if answers is None:
+            raise ValueError("answers must be 8 characters of 0/1 or an object of JDI8 answers")
+        return SCORE_TABLE[answers], answers
+    score = parse_score(body.get('score', ''))
+    if score is None:
+        raise ValueError("expected answers or a score between 0 and 8")
+    return score, None
+
+def job_status(job):
+    # Public view of a job; ids, timestamps and (once done) where to fetch the result
+    status = {key: job[key] for key in ('id', 'status', 'profile', 'created') if key in job}
+    status['status_url'] = f"/api/reports/{job['id']}"
+    for key in ('started', 'finished', 'error'):
+        if key in job:
+            status[key] = job[key]
+    if job['status'] in ('done', 'failed'):
+        status['expires'] = job['finished'] + report_jobs.ttl
+    if job['status'] == 'done':
+        status['result_url'] = f"/api/reports/{job['id']}/result"
+    return status
 
 # --- 2. PREMIUM WEB INTERFACE ---
 
 @app.route('/')
 def home():
+    # Only varies on COMMERCIAL_READY, so it is keyed on it
+    return serve_compiled(compiled_page(('home', COMMERCIAL_READY), _build_home))
+
+def _build_home():
     ready_js = "true" if COMMERCIAL_READY else "false"
     return f"""
     <!DOCTYPE html>
@@ -151,36 +476,9 @@ def home():
     <head>
         <meta charset="UTF-8">
         <title>ZENGEN AI | Longevity</title>
-        <style>
-            :root {{ --neon: #39FF14; --bg: #000; }}
-            body {{ margin:0; overflow:hidden; background:var(--bg); color:#fff; font-family:sans-serif; }}
-            #canvas {{ position:fixed; top:0; left:0; width:100%; height:100%; z-index:-1; filter:blur(40px); opacity:0.8; }}
-            .screen {{ position:absolute; width:100vw; height:100vh; display:flex; flex-direction:column; align-items:center; justify-content:center; transition:0.9s cubic-bezier(0.8, 0, 0.2, 1); }}
-            #page1 {{ transform:translateX(0); }}
-            #page2 {{ transform:translateX(100%); }}
-            #page3 {{ transform:translateX(100%); }}
-            h1 {{ font-size:6.5rem; letter-spacing:25px; color:var(--neon); font-weight:100; margin:0; text-shadow:0 0 30px var(--neon); cursor:pointer; }}
-            .card {{ background:rgba(10,10,10,0.85); border:1px solid #222; padding:55px; border-radius:35px; backdrop-filter:blur(30px); width:540px; box-shadow:0 60px 120px #000; position:relative; }}
-            .section-label {{ color:var(--neon); font-size:0.7rem; letter-spacing:5px; margin-bottom:20px; text-transform:uppercase; border-bottom:1px solid #222; padding-bottom:10px; }}
-            .q-item {{ margin-bottom:15px; display:flex; align-items:center; font-size:1.15rem; color:#ccc; }}
-            .q-item label {{ cursor:pointer; width:100%; display:flex; align-items:center; user-select:none; }}
-            input[type="checkbox"] {{ transform:scale(1.7); margin-right:20px; accent-color:var(--neon); }}
-            button {{ background:transparent; color:var(--neon); border:1px solid var(--neon); padding:20px 75px; font-weight:bold; cursor:pointer; letter-spacing:6px; transition:0.6s; margin-top:40px; text-transform:uppercase; }}
-            button:hover {{ background:var(--neon); color:#000; box-shadow:0 0 50px var(--neon); }}
-            .summary-box {{ border-left: 2px solid var(--neon); padding-left: 25px; margin: 35px 0; text-align: left; }}
-            .risk-tag {{ display:inline-block; padding:5px 15px; border-radius:5px; font-size:0.8rem; font-weight:bold; margin-bottom:10px; }}
-            .high {{ background:rgba(255,0,0,0.2); color:#ff4444; border:1px solid #ff4444; }}
-            .mod {{ background:rgba(255,165,0,0.2); color:#ffa500; border:1px solid #ffa500; }}
-            .low {{ background:rgba(57,255,20,0.2); color:var(--neon); border:1px solid var(--neon); }}
-            .val-list {{ list-style: none; padding: 0; color: #888; font-size: 0.95rem; line-height: 2.1; }}
-            .val-list span {{ color: var(--neon); }}
-            .disclaimer {{ position:absolute; bottom:20px; width:100%; text-align:center; font-size:0.55rem; color:#444; letter-spacing:1.1px; }}
-            footer {{ position:fixed; bottom:30px; width:100%; text-align:center; z-index:10; font-size:0.6rem; letter-spacing:4px; }}
-            footer a {{ color:#333; text-decoration:none; margin:0 20px; transition:0.3s; }}
-            footer a:hover {{ color:var(--neon); }}
-        </style>
+        <link rel="stylesheet" href="{asset_url('css/zengen.css')}">
     </head>
-    <body>
+    <body data-commercial="{ready_js}">
         <canvas id="canvas"></canvas>
         <div id="page1" class="screen">
             <h1 onclick="move(1,2)">ZENGEN</h1>
@@ -219,78 +517,388 @@ def home():
                 </div>
                 <form id="payForm" action="/create-checkout-session" method="POST">
                     <input type="hidden" name="score" id="scoreInput" value="0">
+                    <input type="hidden" name="answers" id="answersInput" value="00000001">
                     <button type="submit" id="mainBtn" style="width:100%; border:none; background:var(--neon); color:#000;">Unlock Full Access ($5.00)</button>
                 </form>
             </div>
             <div class="disclaimer">ADVICE ONLY. NOT A MEDICAL DIAGNOSIS.</div>
         </div>
         <footer><a href="/legal">LEGAL</a><a href="/about">ABOUT US</a></footer>
-        <script>
-            const canvas = document.getElementById('canvas'); const ctx = canvas.getContext('2d');
-            let w, h, orbs = [], state = "dance", isCommercial = {ready_js};
-            function init() {{
-                w = canvas.width = window.innerWidth; h = canvas.height = window.innerHeight;
-                orbs = []; for(let i=0; i<15; i++) orbs.push({{x:Math.random()*w, y:Math.random()*h, r:Math.random()*200+100, v:{{x:(Math.random()-0.5)*0.6, y:(Math.random()-0.5)*0.6}}}});
-            }}
-            function draw() {{
-                ctx.clearRect(0,0,w,h);
-                orbs.forEach(o => {{
-                    if(state === "dance") {{ o.x += o.v.x; o.y += o.v.y; if(o.x<0||o.x>w) o.v.x*=-1; if(o.y<0||o.y>h) o.v.y*=-1; }}
-                    else {{ o.x += (w/2 - o.x) * 0.02; o.y += (h/2 - o.y) * 0.02; o.r += (150 - o.r) * 0.01; }}
-                    let g = ctx.createRadialGradient(o.x,o.y,0,o.x,o.y,o.r); g.addColorStop(0,'rgba(57,255,20,0.4)'); g.addColorStop(1,'rgba(0,0,0,0)');
-                    ctx.fillStyle=g; ctx.beginPath(); ctx.arc(o.x,o.y,o.r,0,Math.PI*2); ctx.fill();
-                }}); requestAnimationFrame(draw);
-            }}
-            init(); draw();
-            function move(f, t) {{
-                if(f===1) state = "converge"; 
-                let s = document.querySelectorAll('.j:checked').length + document.querySelectorAll('.j-inv:checked').length;
-                document.getElementById('dispScore').innerText = s;
-                document.getElementById('scoreInput').value = s;
-                const tag = document.getElementById('riskTag'); const desc = document.getElementById('riskDesc');
-                if(s <= 3) {{ tag.innerText = "HIGH RISK"; tag.className = "risk-tag high"; desc.innerText = "Your biological data suggests a critical lack of traditional genetic triggers. Immediate protocol implementation recommended."; }}
-                else if(s <= 6) {{ tag.innerText = "MODERATE RISK"; tag.className = "risk-tag mod"; desc.innerText = "Your current dietary index is stable but lacks the specific marine enzyme activation needed for optimal NAD+ repair."; }}
-                else {{ tag.innerText = "LOW RISK"; tag.className = "risk-tag low"; desc.innerText = "Exceptional biological alignment. Use the blueprint to fine-tune your NAD+ precursors and spermine levels."; }}
-                if(!isCommercial) {{ document.getElementById('mainBtn').innerText = "TEST: DOWNLOAD PDF"; document.getElementById('payForm').onsubmit = (e) => {{ e.preventDefault(); window.location.href = "/download-report?score=" + s; }}; }}
-                document.getElementById('page'+f).style.transform = 'translateX(-100%)';
-                document.getElementById('page'+t).style.transform = 'translateX(0)';
-            }}
-        </script>
+        <script src="{asset_url('js/zengen.js')}"></script>
     </body>
     </html>
     """
 
 @app.route('/create-checkout-session', methods=['POST'])
 def create_checkout_session():
-    score = request.form.get('score', 0)
+    answers = parse_answers(request.form.get('answers', ''))
+    score = parse_score(request.form.get('score', 0))
+    if answers is not None:
+        metadata = {'answers': format_answers(answers)}
+    elif score is not None:
+        metadata = {'score': str(score)}
+    else:
+        return "Invalid score", 400
+    stripe = get_stripe()
     try:
-        session = stripe.checkout.Session.create(
-            line_items=[{'price_data': {'currency': 'usd', 'product_data': {'name': 'ZENGEN Longevity Blueprint'}, 'unit_amount': 500}, 'quantity': 1}],
-            mode='payment',
-            locale='en',
-            success_url=request.host_url + f'success?score={score}',
-            cancel_url=request.host_url,
-        )
+        with metrics.timed('stripe_request_duration_seconds', operation='checkout.Session.create'):
+            session = stripe.checkout.Session.create(
+                line_items=[{'price_data': {'currency': 'usd', 'product_data': {'name': 'ZENGEN Longevity Blueprint'}, 'unit_amount': 500}, 'quantity': 1}],
+                mode='payment',
+                locale='en',
+                metadata=metadata,
+                success_url=request.host_url + 'success?session_id={CHECKOUT_SESSION_ID}',
+                cancel_url=request.host_url,
+            )
         return redirect(session.url, code=303)
-    except Exception as e: return str(e), 500
+    except stripe.APIConnectionError as e:
+        # Timeout or connection failure talking to Stripe: ask the browser to retry rather than hang
+        metrics.inc('stripe_errors_total', type=type(e).__name__)
+        app.logger.warning("Stripe unreachable: %s", e)
+        return "Payment provider unavailable, please retry shortly.", 503, {'Retry-After': '5'}
+    except Exception as e:
+        metrics.inc('stripe_errors_total', type=type(e).__name__)
+        app.logger.exception("Checkout session creation failed")
+        return str(e), 500
 
 @app.route('/success')
 def success():
-    score = request.args.get('score', 0)
-    return f"""<body style="background:#000; color:#fff; display:flex; flex-direction:column; align-items:center; justify-content:center; height:100vh; font-family:sans-serif; margin:0;"><h2 style="color:#39FF14; letter-spacing:5px;">PAYMENT SUCCESSFUL</h2><a href="/download-report?score={score}" style="text-decoration:none; background:#39FF14; color:#000; padding:20px 40px; font-weight:bold; border-radius:5px; margin-top:30px;">DOWNLOAD OFFICIAL BLUEPRINT</a></body>"""
+    if 'session_id' in request.args:
+        # Stripe substitutes the checkout session id. The download link is signed only once the webhook has recorded
+        # the session or Stripe confirms it is paid; until then the page just re-checks itself.
+        session_id = request.args['session_id']
+        if not fulfillment.valid_session_id(session_id):
+            abort(400, description="invalid checkout session")
+        if fulfillment_store.lookup(session_id) is None and session_id not in _inflight_fulfillments:
+            try:
+                args = _paid_session_args(session_id)
+            except Exception as e:
+                return _stripe_error_response(e)
+            if args is None:
+                response = Response(_build_pending(session_id), mimetype='text/html')
+                response.headers['Cache-Control'] = 'private, no-store'
+                return response
+            start_fulfillment(session_id, *args, trigger='success')
+        response = Response(_build_success(f"/reports/{fulfillment.sign_token(session_id)}"), mimetype='text/html')
+        response.headers['Cache-Control'] = 'private, no-store'
+        return response
+    # Legacy links from before webhook fulfillment: test mode only (see _require_test_mode)
+    _require_test_mode()
+    answers = parse_answers(request.args.get('answers', ''))
+    if answers is not None:
+        report_query = f'answers={format_answers(answers)}'
+    else:
+        report_query = f'score={parse_score(request.args.get("score", 0)) or 0}'
+    return serve_compiled(compiled_page(('success', report_query),
+                                        lambda: _build_success(f"/download-report?{report_query}"),
+                                        'private, max-age=300'))
+
+def _build_pending(session_id):
+    return f"""<head><meta http-equiv="refresh" content="3"></head><body style="background:#000; color:#fff; display:flex; flex-direction:column; align-items:center; justify-content:center; height:100vh; font-family:sans-serif; margin:0;"><h2 style="color:#39FF14; letter-spacing:5px;">CONFIRMING PAYMENT</h2><p>Your blueprint will be ready as soon as the payment clears.</p><a href="/success?session_id={session_id}" style="color:#39FF14;">CHECK AGAIN</a></body>"""
+
+def _build_success(download_url):
+    return f"""<body style="background:#000; color:#fff; display:flex; flex-direction:column; align-items:center; justify-content:center; height:100vh; font-family:sans-serif; margin:0;"><h2 style="color:#39FF14; letter-spacing:5px;">PAYMENT SUCCESSFUL</h2><a href="{download_url}" style="text-decoration:none; background:#39FF14; color:#000; padding:20px 40px; font-weight:bold; border-radius:5px; margin-top:30px;">DOWNLOAD OFFICIAL BLUEPRINT</a></body>"""
+
+def _send_report(data, etag, path, mimetype='application/pdf', download_name="ZENGEN_Official_Report.pdf",
+                 cache_control='private, max-age=86400'):
+    # Both paths answer If-None-Match with 304 and honour Range requests so interrupted mobile downloads can resume.
+    # download_name=None serves the file inline (previews).
+    if path is not None:
+        response = send_file(path, mimetype=mimetype, as_attachment=download_name is not None,
+                             download_name=download_name, etag=etag, conditional=True)
+    else:
+        # The cached bytes object is handed to the WSGI server as-is; no per-request copy is made
+        response = Response(data, mimetype=mimetype)
+        if download_name is not None:
+            response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+        response.set_etag(etag)
+        response = response.make_conditional(request, accept_ranges=True, complete_length=len(data))
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+def _report_query():
+    # (score, answers) from ?answers=<8 x 0/1> or ?score=<0-8>; aborts with 400 on anything else
+    if 'answers' in request.args:
+        answers = parse_answers(request.args['answers'])
+        if answers is None:
+            abort(400, description="answers must be 8 characters of 0/1")
+        return None, answers
+    score = parse_score(request.args.get('score', 0))
+    if score is None:
+        abort(400, description="score must be an integer between 0 and 8")
+    return score, None
+
+def _render_busy():
+    # Shed load instead of queueing without bound; the client retries after the hint
+    return "Report renderer busy, please retry shortly.", 503, {'Retry-After': str(RENDER_RETRY_AFTER)}
+
+def _require_test_mode():
+    # Query-string downloads predate webhook fulfillment and exist only for the !isCommercial test flow in zengen.js.
+    # With COMMERCIAL_READY, paid reports are delivered solely through signed /reports/<token> links.
+    if COMMERCIAL_READY:
+        abort(404)
 
 @app.route('/download-report')
 def download_report():
-    score = int(request.args.get('score', 0))
-    return send_file(create_report(score), as_attachment=True, download_name=f"ZENGEN_Official_Report.pdf", mimetype='application/pdf')
+    _require_test_mode()
+    score, answers = _report_query()
+    profile = request.args.get('profile', 'standard')
+    if profile not in PDF_PROFILES:
+        abort(400, description=f"profile must be one of {', '.join(PDF_PROFILES)}")
+    try:
+        entry = _report_entry(score, answers, render=render_report, profile=profile)
+    except RenderQueueFull:
+        return _render_busy()
+    return _send_report(*entry)
+
+@app.route('/report-preview')
+def report_preview():
+    # Page 1 score card as an image; ?format=png|webp, otherwise negotiated from Accept
+    score, answers = _report_query()
+    fmt = request.args.get('format')
+    if fmt is None:
+        fmt = 'webp' if request.accept_mimetypes.best_match(['image/png', 'image/webp']) == 'image/webp' else 'png'
+    elif fmt not in PREVIEW_PROFILES:
+        abort(400, description=f"format must be one of {', '.join(PREVIEW_PROFILES)}")
+    try:
+        entry = _report_entry(score, answers, render=render_report, profile=fmt)
+    except RenderQueueFull:
+        return _render_busy()
+    response = _send_report(*entry, mimetype=f'image/{fmt}', download_name=None,
+                            cache_control='public, max-age=86400')
+    if 'format' not in request.args:
+        response.vary.add('Accept')
+    return response
+
+@app.route('/webhooks/stripe', methods=['POST'])
+def stripe_webhook():
+    if not STRIPE_WEBHOOK_SECRET:
+        abort(404)
+    stripe = get_stripe()
+    try:
+        event = stripe.Webhook.construct_event(request.get_data(), request.headers.get('Stripe-Signature'),
+                                               STRIPE_WEBHOOK_SECRET)
+    except (ValueError, stripe.SignatureVerificationError):
+        return "Invalid webhook payload or signature", 400
+    if event['type'] in ('checkout.session.completed', 'checkout.session.async_payment_succeeded'):
+        session = event['data']['object'].to_dict()
+        args = report_args(session.get('metadata'))
+        if session.get('payment_status') == 'paid' and args and fulfillment.valid_session_id(session.get('id')):
+            # Acknowledge immediately; Stripe retries slow webhooks, and single-flight absorbs the retries
+            start_fulfillment(session['id'], *args)
+    return jsonify(received=True)
+
+def _paid_session_args(session_id):
+    # Confirms payment with Stripe: (score, answers) for a paid checkout session, else None
+    stripe = get_stripe()
+    with metrics.timed('stripe_request_duration_seconds', operation='checkout.Session.retrieve'):
+        session = stripe.checkout.Session.retrieve(session_id).to_dict()
+    return report_args(session.get('metadata')) if session.get('payment_status') == 'paid' else None
+
+def _stripe_error_response(e):
+    # An unknown session is a 404 and an unreachable Stripe a retryable 503; anything else propagates
+    stripe = get_stripe()
+    if isinstance(e, stripe.InvalidRequestError):
+        abort(404)
+    if isinstance(e, stripe.APIConnectionError):
+        return "Payment provider unavailable, please retry shortly.", 503, {'Retry-After': '5'}
+    raise e
+
+def _fulfill_on_download(session_id, deadline):
+    # The webhook is late, lost or failed: confirm payment with Stripe and render now, waiting until `deadline`
+    # (time.monotonic()). Returns the stored path, or None when the session is not paid.
+    args = _paid_session_args(session_id)
+    if args is None:
+        return None
+    future = start_fulfillment(session_id, *args, trigger='download')
+    return future.result(timeout=max(deadline - time.monotonic(), 0))
+
+@app.route('/reports/<token>')
+def paid_report(token):
+    session_id = fulfillment.verify_token(token)
+    if session_id is None:
+        abort(404, description="This download link is invalid or has expired.")
+    path = fulfillment_store.lookup(session_id)
+    result = 'ready'
+    if path is None:
+        result = 'waited'
+        # One deadline covers waiting on a background render and any render started here
+        deadline = time.monotonic() + RENDER_TIMEOUT
+        in_flight = _inflight_fulfillments.get(session_id)
+        try:
+            if in_flight is not None:
+                path = in_flight.result(timeout=RENDER_TIMEOUT)
+            else:
+                path = _fulfill_on_download(session_id, deadline)
+        except (RenderQueueFull, FutureTimeoutError):
+            return _render_busy()
+        except Exception as e:
+            return _stripe_error_response(e)
+        if path is None:
+            metrics.inc('paid_report_downloads_total', result='unpaid')
+            return "Payment has not completed for this checkout session.", 402
+    metrics.inc('paid_report_downloads_total', result=result)
+
+    if FULFILLMENT_ACCEL_PREFIX:
+        # nginx serves the file from an internal location; the worker only sends headers
+        response = Response(mimetype='application/pdf')
+        response.headers['X-Accel-Redirect'] = FULFILLMENT_ACCEL_PREFIX.rstrip('/') + '/' + os.path.basename(path)
+        response.headers['Content-Disposition'] = 'attachment; filename=ZENGEN_Official_Report.pdf'
+    else:
+        response = send_file(path, mimetype='application/pdf', as_attachment=True,
+                             download_name="ZENGEN_Official_Report.pdf", conditional=True)
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+# --- 3. JDI8 SCORING API ---
+
+@app.route('/api/calculate_score', methods=['POST'])
+def calculate_score():
+    answers = request.get_json(silent=True)
+    if not isinstance(answers, dict):
+        return jsonify(error="expected a JSON object of JDI8 answers"), 400
+    try:
+        result = score_answers(answers)
+        mask = pack_answers(answers)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    result['answers'] = format_answers(mask)
+    result['protocol'] = [dict(zip(('day', 'focus', 'action'), row)) for row in select_protocol(result['score'], mask)]
+    return jsonify(result)
+
+@app.route('/api/calculate_score/bulk', methods=['POST'])
+def calculate_score_bulk():
+    # Accepts a JSON array or an NDJSON stream (one respondent per line) and scores the cohort in one pass
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            packed = pack_cohort(iter_ndjson(request.stream))
+        else:
+            records = request.get_json(silent=True)
+            if not isinstance(records, list):
+                return jsonify(error="expected a JSON array of respondents"), 400
+            packed = pack_cohort(records)
+    except OverflowError as e:
+        return jsonify(error=str(e)), 413
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    scores = score_cohort(packed)
+    distribution = [scores.count(score) for score in range(len(JDI8_ITEMS) + 1)]
+    return jsonify(
+        count=len(scores),
+        scores=list(scores),
+        risk_reduction=[RISK_TABLE[score] for score in scores],
+        distribution=distribution,
+    )
+
+@app.route('/api/reports/bulk', methods=['POST'])
+def bulk_report_archive():
+    # CSV (text/csv), NDJSON or a JSON array of respondents -> streamed ZIP of PDFs plus manifest.csv.
+    # Every distinct answer vector is resolved through the report cache before the first byte is sent,
+    # so a busy renderer is a clean 503 rather than a truncated archive.
+    try:
+        if request.mimetype == 'text/csv':
+            records = bulk_reports.open_records(request.stream, 'csv')
+        elif request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            records = bulk_reports.open_records(request.stream, 'ndjson')
+        else:
+            records = request.get_json(silent=True)
+            if not isinstance(records, list):
+                return jsonify(error="expected a JSON array, NDJSON or CSV of respondents"), 400
+        respondents = list(bulk_reports.read_respondents(records, limit=MAX_BULK_RESPONDENTS))
+    except OverflowError as e:
+        return jsonify(error=str(e)), 413
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    distinct = sorted({mask for _, mask in respondents})
+    try:
+        with ThreadPoolExecutor(max(min(RENDER_WORKERS, RENDER_QUEUE_DEPTH), 1)) as threads:
+            entries = dict(zip(distinct, threads.map(lambda mask: _report_entry(None, mask, render=render_report),
+                                                     distinct)))
+    except RenderQueueFull:
+        return _render_busy()
+
+    def cached_pdf(mask):
+        data, _, path = entries[mask]
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        return data
+
+    reports = bulk_reports.iter_reports(respondents, render=cached_pdf)
+    response = Response(bulk_reports.stream_zip(reports), mimetype='application/zip')
+    response.headers['Content-Disposition'] = 'attachment; filename=ZENGEN_Reports.zip'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/reports', methods=['POST'])
+def submit_report_job():
+    # {"answers" | "score", "profile"?} -> 202 with the job's status URL in Location
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify(error="expected a JSON object with answers or score"), 400
+    try:
+        score, answers = job_args(body)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    profile = body.get('profile', 'standard')
+    if profile not in PDF_PROFILES + PREVIEW_PROFILES:
+        return jsonify(error=f"profile must be one of {', '.join(PDF_PROFILES + PREVIEW_PROFILES)}"), 400
+
+    job_runner.start()
+    ext = 'pdf' if profile in PDF_PROFILES else profile
+    try:
+        job = report_jobs.submit({'score': score, 'answers': answers, 'profile': profile, 'ext': ext})
+    except jobs.QueueFull:
+        return jsonify(error="report queue is full, please retry shortly"), 503, {'Retry-After': str(RENDER_RETRY_AFTER)}
+    status = job_status(job)
+    return jsonify(status), 202, {'Location': status['status_url'], 'Retry-After': '1'}
+
+@app.route('/api/reports/<job_id>')
+def report_job(job_id):
+    job_runner.start()
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify(error="unknown or expired report job"), 404
+    headers = {'Cache-Control': 'no-store'}
+    if job['status'] in ('queued', 'running'):
+        headers['Retry-After'] = '1'
+    return jsonify(job_status(job)), 200, headers
+
+@app.route('/api/reports/<job_id>/result')
+def report_job_result(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify(error="unknown or expired report job"), 404
+    if job['status'] == 'failed':
+        return jsonify(job_status(job)), 409
+    if job['status'] != 'done':
+        return jsonify(job_status(job)), 409, {'Retry-After': '1'}
+    pdf = job['ext'] == 'pdf'
+    try:
+        response = send_file(report_jobs.result_path(job), mimetype='application/pdf' if pdf else f"image/{job['ext']}",
+                             as_attachment=pdf, download_name="ZENGEN_Official_Report.pdf" if pdf else None,
+                             conditional=True)
+    except FileNotFoundError:
+        # Swept between the status read and the open
+        return jsonify(error="unknown or expired report job"), 404
+    response.headers['Cache-Control'] = 'private, max-age=3600'
+    return response
 
 @app.route('/about')
 def about():
-    return f"""<body style="background:#000;color:#fff;padding:80px;font-family:sans-serif;line-height:2.8;"><h1 style="color:#39FF14;">ABOUT US</h1><p>Curated by Ryo Sakuma, Hokkaido University Graduate School of Engineering.</p><a href="/" style="color:#39FF14;">BACK</a></body>"""
+    return serve_compiled(compiled_page('about', _build_about))
+
+def _build_about():
+    return """<body style="background:#000;color:#fff;padding:80px;font-family:sans-serif;line-height:2.8;"><h1 style="color:#39FF14;">ABOUT US</h1><p>Curated by Ryo Sakuma, Hokkaido University Graduate School of Engineering.</p><a href="/" style="color:#39FF14;">BACK</a></body>"""
 
 # Finalized Commercial Disclosure with Ryo Sakuma's name and institution
 @app.route('/legal')
 def legal():
+    return serve_compiled(compiled_page('legal', _build_legal))
+
+def _build_legal():
     return """
     <body style="background:#000;color:#fff;padding:40px;font-family:sans-serif;line-height:1.6;">
         <h1 style="color:#39FF14;letter-spacing:5px;">COMMERCE DISCLOSURE (Specified Commercial Transactions Act)</h1>
@@ -313,6 +921,22 @@ def legal():
     </body>
     """
 
+# --- STARTUP ---
+def warm_up():
+    # Loads the heavy imports and fills every cache. gunicorn.conf.py calls this in the master before
+    # forking when preload_app is on, so all workers share the warmed memory copy-on-write.
+    started = time.perf_counter()
+    import report  # ReportLab, fonts, table style and the recorded static page layers
+    get_stripe()
+    warm_report_cache()
+    warm_page_cache()
+    return time.perf_counter() - started
+
+# Eager warm-up at import is opt-in (REPORT_CACHE_WARM=1); otherwise gunicorn's hooks or first use pay for it
+if os.environ.get("REPORT_CACHE_WARM") == "1":
+    warm_up()
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
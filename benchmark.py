@@ -0,0 +1,327 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import make_server
+
+from stripe_stub import percentile
+
+# --- BENCHMARK & LOAD-TEST SUITE ---
+#   python benchmark.py micro --output bench.json --compare benchmark_baseline.json
+#   python benchmark.py load --workers 4 --concurrency 16 --duration 10 --output load.json
+#   python benchmark.py startup --compare
+# "micro" times create_report per score, each output profile and every route in-process (Stripe served by stripe_stub).
+# "load" starts stripe_stub + gunicorn locally and drives them over HTTP from many client threads.
+# "startup" times a cold `import app` in fresh interpreters, the pre-fork warm-up, and first requests.
+# Metric names encode direction: *_ms / *_bytes are lower-is-better, *_per_s is higher-is-better.
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmark_baseline.json')
+# The query-string download routes are test-mode only (COMMERCIAL_READY=0); they still exercise the full
+# report cache and render path that signed paid downloads use.
+ROUTES = {
+    'home': ('GET', '/', None),
+    'success': ('GET', '/success?answers=11011001', None),
+    'download_report': ('GET', '/download-report?answers=11011001', None),
+    'checkout': ('POST', '/create-checkout-session', {'answers': '11011001', 'score': '5'}),
+}
+
+
+def percentiles(samples_ms):
+    return {
+        'p50_ms': round(percentile(samples_ms, 50), 3),
+        'p95_ms': round(percentile(samples_ms, 95), 3),
+        'p99_ms': round(percentile(samples_ms, 99), 3),
+    }
+
+
+def bench_render(iterations):
+    from app import create_report
+    metrics = {}
+    for score in range(9):
+        create_report(score)
+        # Best of five rounds with GC paused, so a noisy neighbour doesn't read as a regression
+        elapsed = float('inf')
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(5):
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    size = len(create_report(score).getvalue())
+                elapsed = min(elapsed, time.perf_counter() - start)
+        finally:
+            gc.enable()
+
+        tracemalloc.start()
+        create_report(score)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        prefix = f'render.score_{score}'
+        metrics[f'{prefix}.renders_per_s'] = round(iterations / elapsed, 1)
+        metrics[f'{prefix}.peak_alloc_bytes'] = peak
+        metrics[f'{prefix}.pdf_bytes'] = size
+    return metrics
+
+
+def bench_profiles(iterations):
+    # Size and render speed of every output profile (see report.PROFILES)
+    from report import PROFILES, render_profile
+    metrics = {}
+    for profile in PROFILES:
+        sizes = [len(render_profile(score, None, profile)) for score in range(9)]
+        start = time.perf_counter()
+        for _ in range(iterations):
+            render_profile(5, None, profile)
+        elapsed = time.perf_counter() - start
+        metrics[f'profile.{profile}.max_bytes'] = max(sizes)
+        metrics[f'profile.{profile}.renders_per_s'] = round(iterations / elapsed, 1)
+    return metrics
+
+
+def _start_stub():
+    from stripe_stub import stub
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, stub, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def bench_routes(iterations):
+    import stripe
+    import app as app_module
+    from app import app
+    app_module.COMMERCIAL_READY = False
+    server, api_base = _start_stub()
+    stripe.api_base = api_base
+    client = app.test_client()
+    metrics = {}
+    try:
+        for name, (method, path, form) in ROUTES.items():
+            samples = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                response = client.open(path, method=method, data=form)
+                samples.append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{name} returned {response.status_code}")
+            for key, value in percentiles(samples).items():
+                metrics[f'route.{name}.{key}'] = value
+    finally:
+        server.shutdown()
+    return metrics
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).close()
+            return
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def run_load(workers, concurrency, duration, worker_class):
+    stub_port, app_port = _free_port(), _free_port()
+    env = dict(os.environ, STRIPE_API_BASE=f'http://127.0.0.1:{stub_port}', GUNICORN_WORKER_CLASS=worker_class,
+               COMMERCIAL_READY='0')
+    processes = [
+        subprocess.Popen([sys.executable, 'stripe_stub.py', 'serve', '--port', str(stub_port)], cwd=ROOT,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+        subprocess.Popen([sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{app_port}',
+                          '--workers', str(workers)], cwd=ROOT, env=env,
+                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL),
+    ]
+    app_url = f'http://127.0.0.1:{app_port}'
+    opener = urllib.request.build_opener(_NoRedirect)
+    samples = {name: [] for name in ROUTES}
+    errors = {name: 0 for name in ROUTES}
+    try:
+        _wait_for(f'http://127.0.0.1:{stub_port}/pay/probe')
+        _wait_for(app_url + '/')
+
+        def client(offset):
+            names = list(ROUTES)
+            i = offset
+            deadline = time.perf_counter() + duration
+            while time.perf_counter() < deadline:
+                name = names[i % len(names)]
+                method, path, form = ROUTES[name]
+                data = urllib.parse.urlencode(form).encode() if form else None
+                start = time.perf_counter()
+                try:
+                    opener.open(app_url + path, data=data, timeout=30).read()
+                except urllib.error.HTTPError as e:
+                    if e.code != 303:
+                        errors[name] += 1
+                        i += 1
+                        continue
+                except OSError:
+                    errors[name] += 1
+                    i += 1
+                    continue
+                samples[name].append((time.perf_counter() - start) * 1000)
+                i += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(client, range(concurrency)))
+        elapsed = time.perf_counter() - started
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+
+    metrics = {'load.total.requests_per_s': round(sum(map(len, samples.values())) / elapsed, 1)}
+    for name, values in samples.items():
+        if values:
+            for key, value in percentiles(values).items():
+                metrics[f'load.{name}.{key}'] = value
+        metrics[f'load.{name}.errors'] = errors[name]
+    return metrics
+
+
+STARTUP_PROBE = """
+import time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+client.get('/')
+first_page = time.perf_counter()
+client.get('/download-report?answers=11011001')
+first_report = time.perf_counter()
+warm = app.warm_up()
+print(imported - started, first_page - imported, first_report - first_page, warm)
+"""
+
+
+def bench_startup(rounds):
+    # Each round is a fresh interpreter, so module imports and caches are genuinely cold
+    samples = {'import': [], 'first_page': [], 'first_report': [], 'warm_up': []}
+    env = dict(os.environ, REPORT_CACHE_WARM='0', COMMERCIAL_READY='0')
+    env.pop('REPORT_CACHE_DIR', None)
+    for _ in range(rounds):
+        output = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=ROOT, env=env, check=True,
+                                capture_output=True, text=True).stdout
+        for name, value in zip(samples, output.split()[-4:]):
+            samples[name].append(float(value) * 1000)
+    return {f'startup.{name}_ms': round(min(values), 1) for name, values in samples.items()}
+
+
+def compare(metrics, baseline, tolerance, min_delta_ms=1.0):
+    # Returns human-readable regressions: metrics that moved the wrong way by more than `tolerance`.
+    # p99 values are recorded but not gated; on shared hosts they are dominated by scheduler noise.
+    regressions = []
+    for name, base in baseline.get('metrics', {}).items():
+        current = metrics.get(name)
+        if current is None or name.endswith('.p99_ms'):
+            continue
+        if name.endswith('.errors'):
+            if current > base:
+                regressions.append(f"{name}: {base} -> {current}")
+            continue
+        if not base:
+            continue
+        if name.endswith('_per_s'):
+            change = (base - current) / base
+        elif name.endswith('_ms'):
+            # Sub-millisecond wobble on in-process routes is noise, not a regression
+            if current - base < min_delta_ms:
+                continue
+            change = (current - base) / base
+        elif name.endswith('_bytes'):
+            change = (current - base) / base
+        else:
+            continue
+        if change > tolerance:
+            regressions.append(f"{name}: {base} -> {current} ({change:+.0%} worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ZENGEN benchmark and load-test suite")
+    commands = parser.add_subparsers(dest='command', required=True)
+    micro = commands.add_parser('micro', help="in-process render and route benchmarks")
+    micro.add_argument('--iterations', type=int, default=100)
+    load = commands.add_parser('load', help="multi-worker gunicorn load test against a stubbed Stripe")
+    load.add_argument('--workers', type=int, default=2)
+    load.add_argument('--concurrency', type=int, default=8)
+    load.add_argument('--duration', type=float, default=10)
+    load.add_argument('--worker-class', default='gthread')
+    startup = commands.add_parser('startup', help="cold import, warm-up and first-request latency")
+    startup.add_argument('--rounds', type=int, default=5)
+    for command in (micro, load, startup):
+        command.add_argument('--output', help="write results JSON here")
+        command.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE,
+                             help="baseline JSON to compare against (default: benchmark_baseline.json)")
+        command.add_argument('--tolerance', type=float, default=0.3, help="allowed regression ratio")
+        command.add_argument('--min-delta-ms', type=float, default=1.0, help="ignore latency changes below this")
+    args = parser.parse_args()
+
+    if args.command == 'micro':
+        metrics = bench_render(args.iterations)
+        metrics.update(bench_profiles(args.iterations))
+        metrics.update(bench_routes(args.iterations))
+    elif args.command == 'startup':
+        metrics = bench_startup(args.rounds)
+    else:
+        metrics = run_load(args.workers, args.concurrency, args.duration, args.worker_class)
+
+    results = {
+        'meta': {
+            'command': args.command,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'metrics': metrics,
+    }
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(metrics, json.load(f), args.tolerance, args.min_delta_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.compare}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from scoring import RISK_TABLE, SCORE_TABLE, format_answers, iter_csv, iter_ndjson, pack_answers, parse_answers
+
+# --- BULK REPORT GENERATION ---
+# Turns a clinic/corporate respondent file into one ZIP of PDF reports plus a manifest.csv:
+#   python bulk_reports.py respondents.csv -o reports.zip --workers 4
+#   python bulk_reports.py cohort.ndjson -o - > reports.zip
+# A report depends only on the 8-bit answer vector, so each distinct vector (at most 256) is rendered
+# once in the process pool and reused; the archive is written entry by entry, never held in memory.
+# POST /api/reports/bulk in app.py serves the same archive over HTTP.
+ZIP_CHUNK_SIZE = 64 * 1024
+READ_AHEAD = 256
+
+
+def _respondent_mask(record):
+    if isinstance(record, dict) and record.get('answers') not in (None, ''):
+        mask = parse_answers(record['answers'])
+        if mask is None:
+            raise ValueError("answers must be 8 characters of 0/1")
+        return mask
+    return pack_answers(record)
+
+
+def read_respondents(records, limit=None):
+    # Yields (respondent_id, answer mask). Records without an "id" are numbered from 1 in file order.
+    for index, record in enumerate(records):
+        if limit is not None and index >= limit:
+            raise OverflowError(f"bulk requests are limited to {limit} respondents")
+        try:
+            mask = _respondent_mask(record)
+        except ValueError as e:
+            raise ValueError(f"respondent {index}: {e}")
+        respondent_id = record.get('id') if isinstance(record, dict) else None
+        if respondent_id in (None, ''):
+            respondent_id = f"{index + 1:06d}"
+        yield str(respondent_id), mask
+
+
+def open_records(stream, fmt):
+    # stream: binary file object; fmt: 'csv' or 'ndjson'
+    if fmt == 'csv':
+        return iter_csv(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    return iter_ndjson(stream)
+
+
+def render_mask(mask):
+    # Module-level so the process pool can pickle it by reference
+    from report import create_report
+    return create_report(SCORE_TABLE[mask], mask).getvalue()
+
+
+def iter_reports(respondents, render=render_mask, executor=None, read_ahead=READ_AHEAD):
+    # Yields (respondent_id, mask, pdf) in input order. With an executor, distinct vectors render in
+    # parallel while at most `read_ahead` respondents wait for their PDF.
+    rendered = {}
+    futures = {}
+    pending = deque()
+
+    def resolve(mask):
+        if mask not in rendered:
+            future = futures.pop(mask, None)
+            rendered[mask] = future.result() if future is not None else render(mask)
+        return rendered[mask]
+
+    for respondent_id, mask in respondents:
+        if executor is not None and mask not in rendered and mask not in futures:
+            futures[mask] = executor.submit(render, mask)
+        pending.append((respondent_id, mask))
+        while pending and (len(pending) > read_ahead or pending[0][1] in rendered
+                           or (pending[0][1] in futures and futures[pending[0][1]].done())):
+            respondent_id, mask = pending.popleft()
+            yield respondent_id, mask, resolve(mask)
+    while pending:
+        respondent_id, mask = pending.popleft()
+        yield respondent_id, mask, resolve(mask)
+
+
+def _entry_name(respondent_id, used):
+    stem = re.sub(r'[^A-Za-z0-9._-]+', '_', respondent_id).strip('._') or 'respondent'
+    name = f"{stem}.pdf"
+    suffix = 1
+    while name in used:
+        suffix += 1
+        name = f"{stem}_{suffix}.pdf"
+    used.add(name)
+    return name
+
+
+def _zip_reports(reports, fileobj):
+    # Writes the archive to fileobj, yielding (count, pdf_size) after each report and (count, 0) once the
+    # central directory is written. fileobj may be unseekable; zipfile then writes data descriptors.
+    used = set()
+    count = 0
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode='w+', newline='') as manifest, \
+            zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        rows = csv.writer(manifest)
+        rows.writerow(('id', 'file', 'answers', 'score', 'risk_reduction'))
+        for respondent_id, mask, pdf in reports:
+            name = _entry_name(respondent_id, used)
+            archive.writestr(name, pdf)
+            score = SCORE_TABLE[mask]
+            rows.writerow((respondent_id, name, format_answers(mask), score, RISK_TABLE[score]))
+            count += 1
+            yield count, len(pdf)
+        manifest.seek(0)
+        with archive.open('manifest.csv', 'w') as entry:
+            for chunk in iter(lambda: manifest.read(ZIP_CHUNK_SIZE), ''):
+                entry.write(chunk.encode())
+    yield count, 0
+
+
+def write_zip(reports, fileobj, on_report=None):
+    # Returns the number of reports written; on_report(count, pdf_size) is called after each one
+    count = 0
+    for count, size in _zip_reports(reports, fileobj):
+        if size and on_report is not None:
+            on_report(count, size)
+    return count
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only, unseekable buffer that stream_zip drains as it fills
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        return data
+
+
+def stream_zip(reports):
+    # Generator form of write_zip for WSGI responses: yields the archive in ~ZIP_CHUNK_SIZE pieces
+    sink = _ChunkSink()
+    for _ in _zip_reports(reports, sink):
+        if sink.size >= ZIP_CHUNK_SIZE:
+            yield sink.drain()
+    if sink.size:
+        yield sink.drain()
+
+
+class Progress:
+    # One status line on stderr, redrawn at most every `interval` seconds
+    def __init__(self, total=None, stream=sys.stderr, interval=0.5):
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.last = 0.0
+        self.count = 0
+        self.pdf_bytes = 0
+
+    def __call__(self, count, size):
+        self.count = count
+        self.pdf_bytes += size
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            self.draw(now)
+
+    def draw(self, now):
+        rate = self.count / max(now - self.started, 1e-9)
+        done = f"{self.count}/{self.total} ({self.count / self.total:.0%})" if self.total else str(self.count)
+        end = '\r' if self.stream.isatty() else '\n'
+        self.stream.write(f"{done} reports  {rate:.1f} reports/s{end}")
+        self.stream.flush()
+
+
+def _count_records(path, fmt):
+    with open(path, 'rb') as f:
+        lines = sum(1 for line in f if line.strip())
+    return max(lines - 1, 0) if fmt == 'csv' else lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a ZIP of ZENGEN reports from a CSV or NDJSON respondent file")
+    parser.add_argument('input', help="respondent file (.csv, .ndjson/.jsonl), or - for stdin")
+    parser.add_argument('-o', '--output', required=True, help="ZIP file to write, or - for stdout")
+    parser.add_argument('--format', choices=('csv', 'ndjson'), help="input format (default: from the file extension)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="render processes (0 = in-process)")
+    args = parser.parse_args()
+
+    fmt = args.format or ('csv' if args.input.lower().endswith('.csv') else 'ndjson')
+    total = None if args.input == '-' else _count_records(args.input, fmt)
+    source = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    target = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+    executor = None
+    if args.workers > 0:
+        import report  # loaded once here so forked workers start with ReportLab already imported
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=context)
+    progress = Progress(total)
+    try:
+        reports = iter_reports(read_respondents(open_records(source, fmt)), executor=executor)
+        count = write_zip(reports, target, on_report=progress)
+    except (ValueError, OverflowError) as e:
+        sys.exit(f"error: {e}")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if source is not sys.stdin.buffer:
+            source.close()
+        if target is not sys.stdout.buffer:
+            target.close()
+
+    elapsed = time.perf_counter() - progress.started
+    progress.draw(time.perf_counter())
+    if progress.stream.isatty():
+        progress.stream.write('\n')
+    size = os.path.getsize(args.output) if args.output != '-' else None
+    print(f"Wrote {count} reports in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.1f} reports/s, "
+          f"{progress.pdf_bytes / 1e6:.1f} MB of PDF" + (f", {size / 1e6:.1f} MB zipped)" if size else ")"),
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
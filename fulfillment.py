@@ -0,0 +1,116 @@
+import base64
+import hashlib
+import hmac
+import os
+import re
+import tempfile
+import threading
+import time
+
+# --- FULFILLMENT STORE (paid reports by checkout session) ---
+# The Stripe checkout.session.completed webhook renders the buyer's report into FULFILLMENT_DIR as
+# <session_id>.pdf, and the success page links to it through a signed, expiring token, so neither the
+# query string nor the download moment decides what gets rendered. Files older than FULFILLMENT_TTL are
+# removed by a per-process sweeper thread; links expire at the same time.
+FULFILLMENT_DIR = os.environ.get("FULFILLMENT_DIR") or os.path.join(tempfile.gettempdir(), "zengen-fulfillment")
+FULFILLMENT_TTL = int(os.environ.get("FULFILLMENT_TTL", 7 * 24 * 3600))
+SWEEP_INTERVAL = float(os.environ.get("FULFILLMENT_SWEEP_INTERVAL", 600))
+# HMAC key for download links; must be the same on every worker/host serving the links
+TOKEN_SECRET = (os.environ.get("DOWNLOAD_TOKEN_SECRET") or os.environ.get("STRIPE_SECRET_KEY")
+                or "zengen-dev-token-secret").encode()
+
+_SESSION_ID = re.compile(r'cs_[A-Za-z0-9_]{1,250}')
+
+
+def valid_session_id(session_id):
+    return isinstance(session_id, str) and _SESSION_ID.fullmatch(session_id) is not None
+
+
+def _signature(payload):
+    digest = hmac.new(TOKEN_SECRET, payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:24]).decode()
+
+
+def sign_token(session_id, ttl=None, now=None):
+    # "<session_id>.<expiry unix time>.<signature>"; URL-safe as is
+    expires = int((now or time.time()) + (FULFILLMENT_TTL if ttl is None else ttl))
+    payload = f"{session_id}.{expires}"
+    return f"{payload}.{_signature(payload)}"
+
+
+def verify_token(token, now=None):
+    # Returns the session id for a genuine, unexpired token, else None
+    try:
+        session_id, expires, signature = str(token).split('.')
+        expired = int(expires) < (now or time.time())
+    except ValueError:
+        return None
+    # Bytes on both sides: compare_digest rejects non-ASCII str, and the token comes straight from the URL
+    if not hmac.compare_digest(signature.encode(), _signature(f"{session_id}.{expires}").encode()):
+        return None
+    if expired or not valid_session_id(session_id):
+        return None
+    return session_id
+
+
+class BlobStore:
+    def __init__(self, root=FULFILLMENT_DIR, ttl=FULFILLMENT_TTL):
+        self.root = root
+        self.ttl = ttl
+        self._sweeper_pid = None
+
+    def path(self, blob_id):
+        if not valid_session_id(blob_id):
+            raise ValueError(f"invalid blob id {blob_id!r}")
+        return os.path.join(self.root, f"{blob_id}.pdf")
+
+    def lookup(self, blob_id, now=None):
+        # Path of a stored, unexpired blob, or None
+        path = self.path(blob_id)
+        try:
+            fresh = os.stat(path).st_mtime + self.ttl >= (now or time.time())
+        except FileNotFoundError:
+            return None
+        return path if fresh else None
+
+    def put(self, blob_id, data):
+        path = self.path(blob_id)
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.start_sweeper()
+        return path
+
+    def sweep(self, now=None):
+        # Deletes expired blobs and temp files left behind by crashed writers; returns how many
+        cutoff = (now or time.time()) - self.ttl
+        removed = 0
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            path = os.path.join(self.root, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(SWEEP_INTERVAL)
+            try:
+                self.sweep()
+            except OSError:
+                pass
+
+    def start_sweeper(self):
+        # One daemon thread per process, started on first write (so it is never inherited across a fork)
+        if self._sweeper_pid != os.getpid():
+            self._sweeper_pid = os.getpid()
+            threading.Thread(target=self._sweep_loop, name='fulfillment-sweeper', daemon=True).start()
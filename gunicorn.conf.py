@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+
+# --- GUNICORN SETTINGS (loaded automatically by `gunicorn app:app`) ---
+# gthread lets a worker keep serving pages while one thread waits on Stripe. "gevent" also works
+# (pip install gevent); "sync" restores the original one-request-per-worker model.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 100))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+
+# Import and warm the app once in the master, then fork: workers start instantly and share the
+# warmed report/page caches, fonts and ReportLab modules copy-on-write. GUNICORN_PRELOAD=0 disables it,
+# in which case each worker warms itself after boot instead.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+# Per-process metric snapshots, merged by /metrics so scrapes cover every worker (see metrics.py)
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"zengen-metrics-{os.getpid()}"))
+
+
+def on_starting(server):
+    # Start each master with an empty snapshot directory so stale pids from a previous run don't linger
+    shutil.rmtree(os.environ["METRICS_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["METRICS_DIR"], exist_ok=True)
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported and before any worker is forked
+    if server.cfg.preload_app:
+        import app
+        server.log.info("Pre-fork warm-up finished in %.2fs (app import %.2fs)", app.warm_up(), app.IMPORT_SECONDS)
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        import app
+        worker.log.info("Worker warm-up finished in %.2fs", app.warm_up())
+
+
+def child_exit(server, worker):
+    # Fold the exited worker's counters into the retired totals and remove its snapshot file
+    import metrics
+    metrics.retire(worker.pid)
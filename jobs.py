@@ -0,0 +1,269 @@
+import fcntl
+import json
+import logging
+import os
+import re
+import secrets
+import tempfile
+import threading
+import time
+
+import metrics
+
+# --- REPORT JOB QUEUE (no broker: one directory per job state on the local filesystem) ---
+# POST /api/reports writes queued/<id>.json. Runner threads in every gunicorn worker claim jobs with an atomic
+# rename into running/, render them and move them to done/ with the result file alongside. Because all state is
+# on disk, any worker can answer a status poll or serve the result, and jobs held by a worker that died are
+# requeued by the sweeper. A job requeued JOB_MAX_ATTEMPTS times (saturated renderer, crashing worker) is failed.
+# Finished jobs and their results expire after JOB_TTL.
+JOBS_DIR = os.environ.get("JOBS_DIR") or os.path.join(tempfile.gettempdir(), "zengen-jobs")
+JOB_TTL = int(os.environ.get("JOB_TTL", 3600))
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", 64))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 0.25))
+JOB_SWEEP_INTERVAL = float(os.environ.get("JOB_SWEEP_INTERVAL", 30))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 5))
+# A running/ entry without a pid is mid-claim; only after this long is its claimer presumed dead
+JOB_CLAIM_GRACE = 60
+STATES = ('queued', 'running', 'done', 'failed')
+
+_JOB_ID = re.compile(r'job_[0-9a-f]{24}')
+
+log = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def valid_job_id(job_id):
+    return isinstance(job_id, str) and _JOB_ID.fullmatch(job_id) is not None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    def __init__(self, root=JOBS_DIR, ttl=JOB_TTL, limit=JOB_QUEUE_LIMIT, max_attempts=JOB_MAX_ATTEMPTS):
+        self.root = root
+        self.ttl = ttl
+        self.limit = limit
+        self.max_attempts = max_attempts
+        self.wakeup = threading.Event()
+
+    def _path(self, state, job_id, ext='json'):
+        return os.path.join(self.root, state, f"{job_id}.{ext}")
+
+    def _write(self, state, job):
+        path = self._path(state, job['id'])
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+    def _names(self, state):
+        try:
+            return [name for name in os.listdir(os.path.join(self.root, state)) if name.endswith('.json')]
+        except FileNotFoundError:
+            return []
+
+    def pending(self):
+        return len(self._names('queued')) + len(self._names('running'))
+
+    def submit(self, spec):
+        # spec: JSON-serialisable job parameters; raises QueueFull beyond `limit` queued + running jobs.
+        # Submitters in every process serialise on an flock, so the count and the write are one step.
+        for state in STATES:
+            os.makedirs(os.path.join(self.root, state), exist_ok=True)
+        with open(os.path.join(self.root, '.submit.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.pending() >= self.limit:
+                metrics.inc('report_jobs_total', result='rejected')
+                raise QueueFull()
+            job = dict(spec, id='job_' + secrets.token_hex(12), created=time.time())
+            self._write('queued', job)
+        metrics.inc('report_jobs_total', result='queued')
+        self.wakeup.set()
+        return dict(job, status='queued')
+
+    def get(self, job_id, now=None):
+        # The job with its current status, or None if unknown or expired
+        if not valid_job_id(job_id):
+            return None
+        # A job can move between directories while we look, so go round twice before giving up
+        for _ in range(2):
+            for state in STATES:
+                try:
+                    with open(self._path(state, job_id)) as f:
+                        job = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    continue
+                if state in ('done', 'failed') and job['finished'] + self.ttl < (now or time.time()):
+                    return None
+                return dict(job, status=state)
+        return None
+
+    def result_path(self, job):
+        return self._path('done', job['id'], job['ext'])
+
+    def claim(self):
+        # Oldest queued job, moved to running/ by an atomic rename so exactly one runner gets it. The owner's pid is
+        # written just after the rename, so sweep() leaves pid-less running jobs alone for JOB_CLAIM_GRACE from
+        # the claim.
+        queued = []
+        for name in self._names('queued'):
+            try:
+                queued.append((os.stat(os.path.join(self.root, 'queued', name)).st_mtime, name))
+            except FileNotFoundError:
+                continue
+        for _, name in sorted(queued):
+            running_path = os.path.join(self.root, 'running', name)
+            try:
+                os.rename(os.path.join(self.root, 'queued', name), running_path)
+                # rename keeps the submit-time mtime; the claim grace must count from now
+                os.utime(running_path)
+                with open(running_path) as f:
+                    job = json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+            job.update(started=time.time(), pid=os.getpid())
+            self._write('running', job)
+            metrics.observe('report_job_wait_seconds', job['started'] - job['created'])
+            return job
+        return None
+
+    def complete(self, job, data):
+        path = self.result_path(job)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._finish('done', job)
+
+    def fail(self, job, error):
+        self._finish('failed', dict(job, error=error))
+
+    def _finish(self, state, job):
+        job = dict(job, finished=time.time())
+        self._write(state, job)
+        try:
+            os.remove(self._path('running', job['id']))
+        except FileNotFoundError:
+            pass
+        metrics.inc('report_jobs_total', result=state)
+
+    def requeue(self, job, reason):
+        # Puts a job back in the queue, or fails it with `reason` once it has used up max_attempts
+        attempts = job.get('attempts', 0) + 1
+        if attempts >= self.max_attempts:
+            self.fail(dict(job, attempts=attempts), f"{reason} (gave up after {attempts} attempts)")
+            return False
+        job = {key: value for key, value in job.items() if key not in ('started', 'pid')}
+        job['attempts'] = attempts
+        self._write('queued', job)
+        try:
+            os.remove(self._path('running', job['id']))
+        except FileNotFoundError:
+            pass
+        metrics.inc('report_jobs_total', result='requeued')
+        return True
+
+    def sweep(self, now=None):
+        # Expires finished jobs (and their results) and queued jobs nobody picked up within the TTL, and
+        # requeues running jobs whose worker process has died. Returns the number of jobs touched.
+        now = now or time.time()
+        touched = 0
+        for state in STATES:
+            for name in self._names(state):
+                try:
+                    with open(os.path.join(self.root, state, name)) as f:
+                        job = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    continue
+                if state == 'running':
+                    if 'pid' in job:
+                        abandoned = not _pid_alive(job['pid'])
+                    else:
+                        try:
+                            abandoned = os.stat(os.path.join(self.root, state, name)).st_mtime + JOB_CLAIM_GRACE < now
+                        except FileNotFoundError:
+                            continue
+                    if abandoned:
+                        self.requeue(job, "worker exited while rendering")
+                        touched += 1
+                    continue
+                if job.get('finished', job['created']) + self.ttl >= now:
+                    continue
+                for path in (os.path.join(self.root, state, name), self._path(state, job['id'], job['ext'])):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                touched += 1
+        return touched
+
+
+class JobRunner:
+    # execute(job) -> result bytes. Exceptions in `retry_on` (e.g. a saturated render pool) put the job back
+    # in the queue; anything else marks it failed.
+    def __init__(self, queue, execute, retry_on=(), workers=JOB_WORKERS):
+        self.queue = queue
+        self.execute = execute
+        self.retry_on = tuple(retry_on)
+        self.workers = workers
+        self._pid = None
+        self._stopped = False
+        self._last_sweep = 0.0
+
+    def start(self):
+        # Threads are started on first use in each process, so a preloading gunicorn master never runs jobs
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._stopped = False
+            self.queue.wakeup = threading.Event()
+            for i in range(self.workers):
+                threading.Thread(target=self._loop, name=f'report-jobs-{i}', daemon=True).start()
+
+    def stop(self):
+        self._stopped = True
+        self.queue.wakeup.set()
+
+    def _loop(self):
+        # Nothing may end a runner thread early: a dead runner would leave the queue stuck
+        while not self._stopped:
+            try:
+                self._step()
+            except Exception:
+                log.exception("Report job runner error")
+                time.sleep(JOB_POLL_INTERVAL)
+
+    def _step(self):
+        if time.monotonic() - self._last_sweep >= JOB_SWEEP_INTERVAL:
+            self._last_sweep = time.monotonic()
+            self.queue.sweep()
+        job = self.queue.claim()
+        if job is None:
+            self.queue.wakeup.wait(JOB_POLL_INTERVAL)
+            self.queue.wakeup.clear()
+            return
+        try:
+            data = self.execute(job)
+        except self.retry_on as e:
+            self.queue.requeue(job, f"{type(e).__name__}: renderer busy")
+            time.sleep(JOB_POLL_INTERVAL)
+            return
+        except Exception as e:
+            self.queue.fail(job, f"{type(e).__name__}: {e}")
+            return
+        try:
+            self.queue.complete(job, data)
+        except OSError as e:
+            self.queue.fail(job, f"{type(e).__name__}: {e}")
+            raise
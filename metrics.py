@@ -0,0 +1,282 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+
+# --- LIGHTWEIGHT METRICS (Prometheus text format) ---
+# Each process keeps counters, gauges and histograms in plain dicts. With METRICS_DIR set (gunicorn.conf.py
+# does this), every process periodically writes a snapshot to METRICS_DIR/metrics_<pid>.json and /metrics
+# merges all snapshots, so the numbers cover every gunicorn worker and render-pool process, not just the
+# one that happened to answer the scrape. When a process exits (gunicorn's child_exit hook, or the next scrape
+# that finds its pid dead) its counters and histograms are folded into metrics_retired.json and its snapshot is
+# deleted, so totals stay monotonic without the directory growing; its gauges are dropped.
+METRICS_DIR = os.environ.get("METRICS_DIR")
+FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 1.0))
+RETIRED_FILE = "metrics_retired.json"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_descriptions = {}  # name -> (type, help, buckets)
+_values = {}  # (name, labels) -> float, or [bucket counts..., sum, count] for histograms
+_dirty = False
+_flusher_pid = None
+_snapshot_pid = None
+
+
+def describe(name, kind, help_text, buckets=LATENCY_BUCKETS):
+    _descriptions[name] = (kind, help_text, tuple(buckets) if kind == 'histogram' else ())
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+    _mark_dirty()
+
+
+def gauge_add(name, value, **labels):
+    inc(name, value, **labels)
+
+
+def observe(name, seconds, **labels):
+    # Undescribed histograms (e.g. report.py used outside the app) fall back to the latency buckets
+    buckets = _descriptions.get(name, ('histogram', '', LATENCY_BUCKETS))[2]
+    key = _key(name, labels)
+    with _lock:
+        series = _values.get(key)
+        if series is None:
+            series = _values[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if seconds <= bound:
+                series[i] += 1
+                break
+        series[-2] += seconds
+        series[-1] += 1
+    _mark_dirty()
+
+
+class PhaseTimer:
+    # Low-overhead phase breakdown: mark('x') records the time since the previous mark under phase="x"
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        observe(self.name, now - self.last, phase=phase, **self.labels)
+        self.last = now
+
+
+class timed:
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = dict(self.labels, outcome='error' if exc_type else 'ok')
+        observe(self.name, time.perf_counter() - self.start, **labels)
+        return False
+
+
+def _snapshot():
+    with _lock:
+        return [[name, list(labels), value] for (name, labels), value in _values.items()]
+
+
+def _snapshot_path(pid):
+    return os.path.join(METRICS_DIR, f"metrics_{pid}.json")
+
+
+def flush():
+    global _dirty, _snapshot_pid
+    _dirty = False
+    if not METRICS_DIR:
+        return
+    if _snapshot_pid != os.getpid():
+        # A snapshot already under this pid was left by an earlier process the OS gave the same pid
+        _snapshot_pid = os.getpid()
+        retire(_snapshot_pid)
+    path = _snapshot_path(os.getpid())
+    tmp_path = path + ".tmp"
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with open(tmp_path, 'w') as f:
+            json.dump(_snapshot(), f)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        if _dirty:
+            flush()
+
+
+def _mark_dirty():
+    # Snapshots are written by a per-process daemon thread, never on the request path
+    global _dirty, _flusher_pid
+    _dirty = True
+    if METRICS_DIR and _flusher_pid != os.getpid():
+        _flusher_pid = os.getpid()
+        threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+        atexit.register(flush)
+
+
+def _reset_after_fork():
+    # A forked child must not re-report the parent's numbers under its own pid
+    global _lock, _dirty
+    _lock = threading.Lock()
+    _values.clear()
+    _dirty = False
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(into, entries, include_gauges):
+    for name, labels, value in entries:
+        kind = _descriptions.get(name, ('counter',))[0]
+        if kind == 'gauge' and not include_gauges:
+            continue
+        key = (name, tuple(tuple(pair) for pair in labels))
+        current = into.get(key)
+        if isinstance(value, list):
+            into[key] = value[:] if current is None else [a + b for a, b in zip(current, value)]
+        else:
+            into[key] = (current or 0) + value
+
+
+class _DirLock:
+    # Serialises retiring and merging across processes sharing METRICS_DIR
+    def __enter__(self):
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        self.file = open(os.path.join(METRICS_DIR, '.lock'), 'w')
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        return False
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def _retire_locked(pid):
+    path = _snapshot_path(pid)
+    if not os.path.exists(path):
+        return False
+    retired_path = os.path.join(METRICS_DIR, RETIRED_FILE)
+    retired = {}
+    _merge(retired, _read_snapshot(retired_path), False)
+    _merge(retired, _read_snapshot(path), False)
+    tmp_path = retired_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump([[name, list(labels), value] for (name, labels), value in retired.items()], f)
+    os.replace(tmp_path, retired_path)
+    os.remove(path)
+    return True
+
+
+def retire(pid):
+    # Folds the snapshot of a process that has exited into metrics_retired.json; True if there was one
+    if not METRICS_DIR:
+        return False
+    try:
+        with _DirLock():
+            return _retire_locked(pid)
+    except OSError:
+        return False
+
+
+def collect():
+    merged = {}
+    _merge(merged, _snapshot(), True)
+    if METRICS_DIR and os.path.isdir(METRICS_DIR):
+        flush()
+        own = os.getpid()
+        with _DirLock():
+            snapshots = []
+            for filename in os.listdir(METRICS_DIR):
+                if not (filename.startswith('metrics_') and filename.endswith('.json')) or filename == RETIRED_FILE:
+                    continue
+                try:
+                    pid = int(filename[len('metrics_'):-len('.json')])
+                except ValueError:
+                    continue
+                if pid == own:
+                    continue
+                if _pid_alive(pid):
+                    snapshots.append(os.path.join(METRICS_DIR, filename))
+                else:
+                    _retire_locked(pid)
+            for path in snapshots:
+                _merge(merged, _read_snapshot(path), True)
+            _merge(merged, _read_snapshot(os.path.join(METRICS_DIR, RETIRED_FILE)), False)
+    return merged
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    merged = collect()
+    by_name = {}
+    for (name, labels), value in sorted(merged.items()):
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(set(by_name) | set(_descriptions)):
+        kind, help_text, buckets = _descriptions.get(name, ('untyped', '', ()))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in by_name.get(name, []):
+            if kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', repr(bound))])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {value[-1]}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value[-1]}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
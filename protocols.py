@@ -0,0 +1,61 @@
+import json
+import os
+
+from scoring import JDI8_ITEMS, INVERSE_ITEMS, SCORE_TABLE
+
+# --- 7-DAY PROTOCOL LIBRARY ---
+# The library file holds one base plan per score band plus "gap" rules: when a respondent misses the point
+# for an item, that item's rule replaces the plan for its day (first matching rule per day wins).
+# compile_protocols() expands this into a flat 256-entry index, one plan per packed answer byte.
+PROTOCOL_LIBRARY_PATH = os.environ.get(
+    "PROTOCOL_LIBRARY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "protocols.json")
+)
+
+
+def load_protocol_library(path=PROTOCOL_LIBRARY_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _band_rows(library, score):
+    for band in library['bands']:
+        if score <= band['max_score']:
+            return band['rows']
+    raise ValueError(f"protocol library has no band for score {score}")
+
+
+def compile_protocols(library):
+    days = library['days']
+    gaps = library['gaps']
+    for rule in gaps:
+        if rule['item'] not in JDI8_ITEMS:
+            raise ValueError(f"unknown JDI8 item in protocol library: {rule['item']}")
+        if rule['day'] not in days:
+            raise ValueError(f"unknown day in protocol library: {rule['day']}")
+
+    bands = tuple(
+        tuple(tuple(row) for row in _band_rows(library, score)) for score in range(len(JDI8_ITEMS) + 1)
+    )
+
+    index = []
+    for mask in range(256):
+        rows = {row[0]: row for row in bands[SCORE_TABLE[mask]]}
+        filled = set()
+        for rule in gaps:
+            bit = JDI8_ITEMS.index(rule['item'])
+            missed = bool(mask >> bit & 1) == (rule['item'] in INVERSE_ITEMS)
+            if missed and rule['day'] not in filled:
+                rows[rule['day']] = (rule['day'], rule['focus'], rule['action'])
+                filled.add(rule['day'])
+        index.append(tuple(rows[day] for day in days))
+    return tuple(index), bands
+
+
+PROTOCOL_INDEX, BAND_PROTOCOLS = compile_protocols(load_protocol_library())
+
+
+def select_protocol(score, mask=None):
+    # O(1): personalized plan when the full answer vector is known, band plan for legacy score-only links
+    if mask is None:
+        return BAND_PROTOCOLS[score]
+    return PROTOCOL_INDEX[mask]
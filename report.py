@@ -0,0 +1,241 @@
+import io
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from reportlab.lib import colors
+from reportlab.platypus import Table, TableStyle
+from reportlab.pdfbase import pdfdoc
+from PIL import Image, ImageDraw, ImageFont
+
+from scoring import SCORE_TABLE
+from protocols import select_protocol
+import metrics
+
+# --- 1. PREMIUM PDF ENGINE (Ryo Sakuma Design) ---
+# Everything except the score, risk line and protocol table is identical in every report. That content is
+# drawn once at import into recorded PDF operator layers, and each render only replays them and draws the overlay.
+REPORT_FONTS = ('Helvetica', 'Helvetica-Bold', 'Helvetica-Oblique')
+
+# --- OUTPUT PROFILES ---
+# standard: the original PDF (ASCII85-wrapped Flate streams, ReportLab's default document info).
+# compact:  same pages, bare Flate streams (ASCII85 adds ~25% to every stream) and a trimmed info dict.
+#           The base-14 fonts are referenced, not embedded, so there is nothing to subset.
+# png/webp: page 1 score card (header, score, risk) as a small image for the results screen and email.
+PROFILES = {
+    'standard': ('application/pdf', 'pdf'),
+    'compact': ('application/pdf', 'pdf'),
+    'png': ('image/png', 'png'),
+    'webp': ('image/webp', 'webp'),
+}
+PREVIEW_SIZE = (596, 362)  # top of page 1 in points, rendered 1pt = 1px
+PREVIEW_COLORS = 32
+
+PROTOCOL_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1A1A1A")),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor("#39FF14")),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor("#333333")),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.white),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+def _register_report_fonts(p):
+    # Registers fonts in a fixed order so their internal names (/F1, /F2, ...) match the recorded layers
+    for name in REPORT_FONTS:
+        p._doc.getInternalFontName(name)
+
+def _draw_page1_static(p):
+    width, height = A4
+
+    # --- PAGE 1: BIOMETRIC ARCHITECTURE ---
+    p.setFillColor(colors.black)
+    p.rect(0, 0, width, height, fill=1)
+    
+    p.setFont("Helvetica-Bold", 12)
+    p.setFillColor(colors.HexColor("#39FF14"))
+    p.drawString(50, height - 50, "OFFICIAL LONGEVITY BLUEPRINT // ZENGEN AI")
+    
+    # Biometric Score Circle
+    p.setStrokeColor(colors.HexColor("#39FF14"))
+    p.setLineWidth(4)
+    p.circle(width/2, height - 170, 85, stroke=1, fill=0)
+    
+    p.setFont("Helvetica-Bold", 14)
+    p.setFillColor(colors.HexColor("#39FF14"))
+    p.drawCentredString(width/2, height - 280, "JDI8 BIOMETRIC SCORE")
+
+    p.setStrokeColor(colors.HexColor("#333333"))
+    p.line(50, height - 350, width - 50, height - 350)
+
+    # Scientific Foundation
+    p.setFont("Helvetica-Bold", 14)
+    p.setFillColor(colors.HexColor("#39FF14"))
+    p.drawString(50, height - 390, "02 // SCIENTIFIC FOUNDATION")
+    p.setFont("Helvetica", 11)
+    p.setFillColor(colors.white)
+    p.drawString(50, height - 415, "Source: Nature (2010). Human gut bacterial metabolism of red seaweed.")
+    p.drawString(50, height - 430, "Porphyranase enzyme pathway specialized for marine polysaccharide processing.")
+
+    # 7-Day Protocol Table (Lowered to avoid overlap with Header 03)
+    p.setFont("Helvetica-Bold", 14)
+    p.setFillColor(colors.HexColor("#39FF14"))
+    p.drawString(50, height - 480, "03 // 7-DAY PERSONALIZED PROTOCOL")
+
+def _draw_page2_static(p):
+    width, height = A4
+
+    # --- PAGE 2: THE GOLD STANDARD STACK ---
+    p.setFillColor(colors.black)
+    p.rect(0, 0, width, height, fill=1)
+    p.setFont("Helvetica-Bold", 16)
+    p.setFillColor(colors.HexColor("#39FF14"))
+    p.drawString(50, height - 60, "04 // THE GOLD STANDARD STACK")
+
+    stacks = [
+        ("Ippodo Matcha", "Highest concentration of L-Theanine for neuroprotection.", "https://amzn.to/3ZgMv0Q"),
+        ("Suntory NMN", "NAD+ precursor. 99.9% purity for cellular DNA repair.", "https://amzn.to/4qTcOHM"),
+        ("Spermidine", "Natural polyamine that triggers cellular autophagy.", "https://amzn.to/4tYE6j2"),
+        ("High-Dose EPA/DHA", "Advanced inflammation and cardiovascular control.", "https://amzn.to/4kRTklz"),
+        ("Zojirushi IH Engine", "Standard for consistent glycaemic index control.", "https://amzn.to/4hfC1sA")
+    ]
+    
+    y = height - 150
+    for title, desc, link in stacks:
+        p.setStrokeColor(colors.HexColor("#222222"))
+        p.rect(50, y - 60, width - 100, 80, stroke=1, fill=0)
+        p.setFont("Helvetica-Bold", 13)
+        p.setFillColor(colors.white)
+        p.drawString(65, y, f"> {title}")
+        p.setFont("Helvetica", 10)
+        p.setFillColor(colors.lightgrey)
+        p.drawString(65, y - 20, desc)
+        p.setFont("Helvetica-Oblique", 9)
+        p.setFillColor(colors.HexColor("#39FF14"))
+        p.drawString(65, y - 45, f"Purchase via Amazon: {link}")
+        y -= 100
+    
+    # Identifies developer as Ryo Sakuma
+    p.setFont("Helvetica", 8)
+    p.setFillColor(colors.HexColor("#444444"))
+    p.drawCentredString(width/2, 40, "DEVELOPED BY RYO SAKUMA // HOKKAIDO UNIVERSITY // ADVICE ONLY") 
+
+def _record_layer(draw):
+    # Draws onto a scratch canvas and keeps the emitted operators, wrapped in q/Q so replaying
+    # the layer leaves the graphics state exactly as the overlay code expects it
+    scratch = canvas.Canvas(io.BytesIO(), pagesize=A4, invariant=1)
+    _register_report_fonts(scratch)
+    start = len(scratch._code)
+    scratch.saveState()
+    draw(scratch)
+    scratch.restoreState()
+    return '\n'.join(scratch._code[start:])
+
+PAGE1_LAYER = _record_layer(_draw_page1_static)
+PAGE2_LAYER = _record_layer(_draw_page2_static)
+
+def risk_label(score):
+    return "HIGH" if score <= 3 else "MODERATE" if score <= 6 else "LOW"
+
+def _compact(p):
+    # Closes the last page, then gives every page a bare Flate stream and trims the document info
+    p.showPage()
+    for page in p._doc.Pages.pages:
+        page.Contents = pdfdoc.PDFStream(content=page.stream, filters=[pdfdoc.PDFZCompress])
+    info = p._doc.info
+    info.title = "ZENGEN Longevity Blueprint"
+    info.author = info.creator = info.producer = info.subject = ""
+
+def create_report(score, answers=None, buffer=None, profile='standard'):
+    # answers: packed JDI8 answer byte (see scoring.py). When given it drives both the score and the protocol.
+    # buffer: optional writable file object; the PDF is written straight into it instead of a new BytesIO.
+    # profile: 'standard' or 'compact' (see PROFILES)
+    if answers is not None:
+        score = SCORE_TABLE[answers]
+    if buffer is None:
+        buffer = io.BytesIO()
+    phases = metrics.PhaseTimer('report_render_phase_seconds')
+    # invariant=1 keeps the output byte-identical across renders/workers (no timestamps or random IDs)
+    p = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+    _register_report_fonts(p)
+    width, height = A4
+
+    # --- PAGE 1: static layer, then the per-score overlay ---
+    p.addLiteral(PAGE1_LAYER)
+
+    p.setFont("Helvetica-Bold", 55)
+    p.setFillColor(colors.white)
+    p.drawCentredString(width/2, height - 190, f"{score}/8")
+    
+    # Dynamic Risk Assessment based on score
+    risk = risk_label(score)
+    p.setFont("Helvetica-Bold", 18)
+    p.setFillColor(colors.white)
+    p.drawCentredString(width/2, height - 320, f"RISK ASSESSMENT: {risk}")
+    phases.mark('page1')
+
+    data = [["Day", "Focus", "Action Plan"]]
+    data.extend(select_protocol(score, answers))
+
+    # Increased rowHeights to 35 to fill space and adjusted drawOn Y
+    table = Table(data, colWidths=[60, 90, 340], rowHeights=35)
+    table.setStyle(PROTOCOL_TABLE_STYLE)
+    table.wrapOn(p, 50, 420)
+    table.drawOn(p, 50, height - 780)
+    phases.mark('table')
+
+    # --- PAGE 2: fully static ---
+    p.showPage()
+    p.addLiteral(PAGE2_LAYER)
+    phases.mark('page2')
+    if profile == 'compact':
+        _compact(p)
+    p.save()
+    phases.mark('save')
+    if isinstance(buffer, io.BytesIO):
+        buffer.seek(0)
+    return buffer
+
+_preview_fonts = {}
+
+def _preview_font(size):
+    font = _preview_fonts.get(size)
+    if font is None:
+        try:
+            font = ImageFont.truetype("DejaVuSans-Bold.ttf", size)
+        except OSError:
+            font = ImageFont.load_default(size)
+        _preview_fonts[size] = font
+    return font
+
+def create_preview(score, fmt='png'):
+    # Redraws the page 1 score card with Pillow at the PDF's coordinates (y flipped), so it matches the report
+    width, height = PREVIEW_SIZE
+    green, white = "#39FF14", "#FFFFFF"
+    image = Image.new('RGB', PREVIEW_SIZE, "#000000")
+    draw = ImageDraw.Draw(image)
+    centre = A4[0] / 2
+    draw.text((50, 50), "OFFICIAL LONGEVITY BLUEPRINT // ZENGEN AI", fill=green, font=_preview_font(12), anchor='ls')
+    draw.ellipse((centre - 85, 170 - 85, centre + 85, 170 + 85), outline=green, width=4)
+    draw.text((centre, 190), f"{score}/8", fill=white, font=_preview_font(55), anchor='ms')
+    draw.text((centre, 280), "JDI8 BIOMETRIC SCORE", fill=green, font=_preview_font(14), anchor='ms')
+    draw.text((centre, 320), f"RISK ASSESSMENT: {risk_label(score)}", fill=white, font=_preview_font(18), anchor='ms')
+    draw.line((50, 350, width - 50, 350), fill="#333333", width=4)
+
+    # Three flat colours plus anti-aliasing fit a small palette; both encoders are lossless on it,
+    # which is smaller than lossy WebP for flat artwork like this (~3 KB vs ~9 KB)
+    image = image.quantize(PREVIEW_COLORS, method=Image.Quantize.FASTOCTREE)
+    out = io.BytesIO()
+    if fmt == 'webp':
+        image.save(out, 'WEBP', lossless=True, quality=100, method=4)
+    else:
+        image.save(out, 'PNG', optimize=True)
+    return out.getvalue()
+
+def render_profile(score, answers=None, profile='standard'):
+    # Bytes for any PROFILES entry; previews depend on the score only
+    if answers is not None:
+        score = SCORE_TABLE[answers]
+    if profile in ('png', 'webp'):
+        return create_preview(score, profile)
+    return create_report(score, answers, profile=profile).getvalue()
@@ -0,0 +1,142 @@
+import csv
+import json
+
+# --- JDI8 SCORING ENGINE ---
+# Each respondent is packed into one byte: bit i is the raw answer ("high intake") for JDI8_ITEMS[i].
+# Seven items score a point for high intake; beef/pork scores a point for LOW intake (inverse factor).
+JDI8_ITEMS = ('rice', 'miso_soup', 'seaweed', 'pickles', 'green_yellow_veg', 'fish', 'green_tea', 'beef_pork')
+INVERSE_ITEMS = ('beef_pork',)
+
+ITEM_LABELS = {
+    'rice': 'Rice',
+    'miso_soup': 'Miso Soup',
+    'seaweed': 'Seaweed',
+    'pickles': 'Pickles',
+    'green_yellow_veg': 'Green/Yellow Vegetables',
+    'fish': 'Fish',
+    'green_tea': 'Green Tea',
+    'beef_pork': 'Beef/Pork',
+}
+
+INVERSE_MASK = sum(1 << JDI8_ITEMS.index(item) for item in INVERSE_ITEMS)
+
+# Score for every possible answer byte; bytes.translate() uses it to score a whole cohort in one C-level pass
+SCORE_TABLE = bytes(bin(mask ^ INVERSE_MASK).count('1') for mask in range(256))
+
+MAX_BULK_RESPONDENTS = 100000
+
+
+def risk_reduction(score):
+    # JDI8 cohort data: 6-8 points vs 0-2 points -> 14% lower all-cause, 11% lower cardiovascular mortality
+    if score >= 6:
+        return "High (14% lower mortality risk)"
+    if score >= 3:
+        return "Moderate (partial protective effect)"
+    return "Baseline (no protective effect)"
+
+
+RISK_TABLE = tuple(risk_reduction(score) for score in range(len(JDI8_ITEMS) + 1))
+
+
+def _as_bool(item, value):
+    if isinstance(value, bool):
+        return value
+    if value in (0, 1) and not isinstance(value, float):
+        return bool(value)
+    raise ValueError(f"{item} must be true/false")
+
+
+def pack_answers(answers):
+    # Accepts a dict keyed by JDI8_ITEMS (missing keys = False) or a list of 8 booleans in JDI8_ITEMS order
+    if isinstance(answers, dict):
+        values = [answers.get(item, False) for item in JDI8_ITEMS]
+    elif isinstance(answers, (list, tuple)) and len(answers) == len(JDI8_ITEMS):
+        values = answers
+    else:
+        raise ValueError("each respondent must be an object of JDI8 answers or a list of 8 booleans")
+
+    mask = 0
+    for bit, (item, value) in enumerate(zip(JDI8_ITEMS, values)):
+        if _as_bool(item, value):
+            mask |= 1 << bit
+    return mask
+
+
+def score_answers(answers):
+    mask = pack_answers(answers)
+    score = SCORE_TABLE[mask]
+    details = []
+    for bit, item in enumerate(JDI8_ITEMS):
+        high = bool(mask >> bit & 1)
+        point = high != (item in INVERSE_ITEMS)
+        details.append(f"{ITEM_LABELS[item]}: {'+1' if point else '+0'} ({'high' if high else 'low'} intake)")
+    return {'score': score, 'risk_reduction': RISK_TABLE[score], 'details': details}
+
+
+def pack_cohort(records):
+    # Bit-packed answer matrix: one byte per respondent
+    packed = bytearray()
+    for index, answers in enumerate(records):
+        if len(packed) >= MAX_BULK_RESPONDENTS:
+            raise OverflowError(f"bulk requests are limited to {MAX_BULK_RESPONDENTS} respondents")
+        try:
+            packed.append(pack_answers(answers))
+        except ValueError as e:
+            raise ValueError(f"respondent {index}: {e}")
+    return packed
+
+
+def score_cohort(packed):
+    return packed.translate(SCORE_TABLE)
+
+
+def iter_ndjson(lines):
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+CSV_TRUE = frozenset(('1', 'true', 'yes', 'y', 'x'))
+CSV_FALSE = frozenset(('0', 'false', 'no', 'n', ''))
+
+
+def iter_csv(lines):
+    # Spreadsheet export with a header row: one column per JDI8 item (1/0, yes/no, true/false, x/blank),
+    # or a single "answers" column in the compact 8-character form. Other columns (e.g. "id") pass through.
+    reader = csv.DictReader(lines)
+    rows = iter(reader)
+    while True:
+        try:
+            row = next(rows)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # e.g. an oversized field or an unterminated quote; DictReader.line_num is only updated per good row
+            raise ValueError(f"line {reader.reader.line_num}: {e}")
+        record = {}
+        for column, value in row.items():
+            if column is None:
+                raise ValueError(f"line {reader.line_num}: more fields than the header")
+            column = column.strip().lower()
+            value = (value or '').strip()
+            if column in JDI8_ITEMS:
+                lowered = value.lower()
+                if lowered not in CSV_TRUE and lowered not in CSV_FALSE:
+                    raise ValueError(f"line {reader.line_num}: {column} must be yes/no, got {value!r}")
+                record[column] = lowered in CSV_TRUE
+            else:
+                record[column] = value
+        yield record
+
+
+def format_answers(mask):
+    # Compact URL form of the answer vector: "1" per high-intake item, in JDI8_ITEMS order
+    return ''.join('1' if mask >> bit & 1 else '0' for bit in range(len(JDI8_ITEMS)))
+
+
+def parse_answers(raw):
+    raw = str(raw).strip()
+    if len(raw) != len(JDI8_ITEMS) or raw.strip('01'):
+        return None
+    return sum(1 << bit for bit, char in enumerate(raw) if char == '1')
@@ -0,0 +1,32 @@
+const canvas = document.getElementById('canvas'); const ctx = canvas.getContext('2d');
+let w, h, orbs = [], state = "dance", isCommercial = document.body.dataset.commercial === "true";
+function init() {
+    w = canvas.width = window.innerWidth; h = canvas.height = window.innerHeight;
+    orbs = []; for(let i=0; i<15; i++) orbs.push({x:Math.random()*w, y:Math.random()*h, r:Math.random()*200+100, v:{x:(Math.random()-0.5)*0.6, y:(Math.random()-0.5)*0.6}});
+}
+function draw() {
+    ctx.clearRect(0,0,w,h);
+    orbs.forEach(o => {
+        if(state === "dance") { o.x += o.v.x; o.y += o.v.y; if(o.x<0||o.x>w) o.v.x*=-1; if(o.y<0||o.y>h) o.v.y*=-1; }
+        else { o.x += (w/2 - o.x) * 0.02; o.y += (h/2 - o.y) * 0.02; o.r += (150 - o.r) * 0.01; }
+        let g = ctx.createRadialGradient(o.x,o.y,0,o.x,o.y,o.r); g.addColorStop(0,'rgba(57,255,20,0.4)'); g.addColorStop(1,'rgba(0,0,0,0)');
+        ctx.fillStyle=g; ctx.beginPath(); ctx.arc(o.x,o.y,o.r,0,Math.PI*2); ctx.fill();
+    }); requestAnimationFrame(draw);
+}
+init(); draw();
+function move(f, t) {
+    if(f===1) state = "converge"; 
+    let s = document.querySelectorAll('.j:checked').length + document.querySelectorAll('.j-inv:checked').length;
+    document.getElementById('dispScore').innerText = s;
+    document.getElementById('scoreInput').value = s;
+    // JDI8 answer vector: 7 high-intake items, then beef/pork (high intake = LOW BEEF/PORK unchecked)
+    let a = Array.from(document.querySelectorAll('.j')).map(c => c.checked ? '1' : '0').join('') + (document.querySelector('.j-inv').checked ? '0' : '1');
+    document.getElementById('answersInput').value = a;
+    const tag = document.getElementById('riskTag'); const desc = document.getElementById('riskDesc');
+    if(s <= 3) { tag.innerText = "HIGH RISK"; tag.className = "risk-tag high"; desc.innerText = "Your biological data suggests a critical lack of traditional genetic triggers. Immediate protocol implementation recommended."; }
+    else if(s <= 6) { tag.innerText = "MODERATE RISK"; tag.className = "risk-tag mod"; desc.innerText = "Your current dietary index is stable but lacks the specific marine enzyme activation needed for optimal NAD+ repair."; }
+    else { tag.innerText = "LOW RISK"; tag.className = "risk-tag low"; desc.innerText = "Exceptional biological alignment. Use the blueprint to fine-tune your NAD+ precursors and spermine levels."; }
+    if(!isCommercial) { document.getElementById('mainBtn').innerText = "TEST: DOWNLOAD PDF"; document.getElementById('payForm').onsubmit = (e) => { e.preventDefault(); window.location.href = "/download-report?answers=" + a; }; }
+    document.getElementById('page'+f).style.transform = 'translateX(-100%)';
+    document.getElementById('page'+t).style.transform = 'translateX(0)';
+}
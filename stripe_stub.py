@@ -0,0 +1,204 @@
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, jsonify, redirect, request
+
+# --- LOCAL STRIPE STAND-IN ---
+# Implements just enough of the Stripe API for the checkout flow, so the app can be load-tested offline:
+#   python stripe_stub.py serve --port 12111 --latency-ms 150
+#   STRIPE_API_BASE=http://127.0.0.1:12111 gunicorn app:app --bind 127.0.0.1:5000
+#   python stripe_stub.py flow --app-url http://127.0.0.1:5000 -n 200 -c 8
+# The "hosted checkout" page /pay/<id> immediately redirects to success_url, as a completed payment would.
+# With --webhook-url (and the app's STRIPE_WEBHOOK_SECRET as --webhook-secret) it first delivers a signed
+# checkout.session.completed event, like Stripe does when a payment settles.
+stub = Flask(__name__)
+stub.config['LATENCY_MS'] = float(os.environ.get("STRIPE_STUB_LATENCY_MS", 0))
+stub.config['WEBHOOK_URL'] = os.environ.get("STRIPE_STUB_WEBHOOK_URL")
+stub.config['WEBHOOK_SECRET'] = os.environ.get("STRIPE_STUB_WEBHOOK_SECRET", "whsec_stub")
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _stripe_error(message, status, error_type='invalid_request_error'):
+    return jsonify(error={'type': error_type, 'message': message}), status
+
+
+@stub.before_request
+def simulate_latency():
+    if stub.config['LATENCY_MS'] > 0 and request.path.startswith('/v1/'):
+        time.sleep(stub.config['LATENCY_MS'] / 1000.0)
+
+
+@stub.route('/v1/checkout/sessions', methods=['POST'])
+def create_session():
+    if not request.headers.get('Authorization', '').startswith('Bearer sk_'):
+        return _stripe_error("Invalid API Key provided.", 401)
+    form = request.form
+    if not form.get('success_url'):
+        return _stripe_error("Missing required param: success_url.", 400)
+
+    amount = 0
+    for key, value in form.items():
+        match = re.fullmatch(r'line_items\[(\d+)\]\[price_data\]\[unit_amount\]', key)
+        if match:
+            amount += int(value) * int(form.get(f'line_items[{match.group(1)}][quantity]', 1))
+
+    metadata = {}
+    for key, value in form.items():
+        match = re.fullmatch(r'metadata\[([^\]]+)\]', key)
+        if match:
+            metadata[match.group(1)] = value
+
+    session_id = 'cs_test_' + secrets.token_hex(12)
+    session = {
+        'id': session_id,
+        'object': 'checkout.session',
+        'amount_total': amount,
+        'currency': form.get('line_items[0][price_data][currency]', 'usd'),
+        'mode': form.get('mode', 'payment'),
+        'payment_status': 'unpaid',
+        'status': 'open',
+        'metadata': metadata,
+        'success_url': form['success_url'],
+        'cancel_url': form.get('cancel_url'),
+        'url': request.host_url + f'pay/{session_id}',
+    }
+    with _sessions_lock:
+        _sessions[session_id] = session
+    return jsonify(session)
+
+
+@stub.route('/v1/checkout/sessions/<session_id>')
+def retrieve_session(session_id):
+    session = _sessions.get(session_id)
+    if session is None:
+        return _stripe_error(f"No such checkout.session: '{session_id}'", 404)
+    return jsonify(session)
+
+
+@stub.route('/pay/<session_id>')
+def pay(session_id):
+    with _sessions_lock:
+        session = _sessions.get(session_id)
+        if session is None:
+            return "Unknown checkout session", 404
+        session.update(payment_status='paid', status='complete')
+    if stub.config['WEBHOOK_URL']:
+        send_webhook(stub.config['WEBHOOK_URL'], 'checkout.session.completed', session, stub.config['WEBHOOK_SECRET'])
+    return redirect(session['success_url'].replace('{CHECKOUT_SESSION_ID}', session_id), code=303)
+
+
+def sign_payload(payload, secret, timestamp=None):
+    # Stripe-Signature header value for a webhook body (scheme v1: HMAC-SHA256 of "<t>.<body>")
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+def webhook_event(event_type, obj):
+    return json.dumps({
+        'id': 'evt_' + secrets.token_hex(12),
+        'object': 'event',
+        'type': event_type,
+        'created': int(time.time()),
+        'data': {'object': obj},
+    }).encode()
+
+
+def send_webhook(url, event_type, obj, secret):
+    payload = webhook_event(event_type, obj)
+    delivery = urllib.request.Request(url, data=payload, headers={
+        'Content-Type': 'application/json',
+        'Stripe-Signature': sign_payload(payload, secret),
+    })
+    try:
+        urllib.request.urlopen(delivery, timeout=10).close()
+    except OSError as e:
+        stub.logger.warning("Webhook delivery to %s failed: %s", url, e)
+
+
+# --- END-TO-END FLOW DRIVER ---
+def run_checkout_flow(app_url, answers='11111110'):
+    # checkout -> (stub) hosted page -> /success -> report download; returns per-step latency in seconds
+    timings = {}
+    start = time.perf_counter()
+    body = f'answers={answers}'.encode()
+    with urllib.request.urlopen(app_url.rstrip('/') + '/create-checkout-session', data=body, timeout=30) as response:
+        success_html = response.read().decode()
+    timings['checkout_to_success'] = time.perf_counter() - start
+
+    match = re.search(r'href="(/(?:reports/|download-report\?)[^"]+)"', success_html)
+    if match is None:
+        raise RuntimeError("success page did not link to a report")
+    step = time.perf_counter()
+    with urllib.request.urlopen(app_url.rstrip('/') + match.group(1), timeout=30) as response:
+        pdf = response.read()
+    if not pdf.startswith(b'%PDF'):
+        raise RuntimeError("download did not return a PDF")
+    timings['download'] = time.perf_counter() - step
+    timings['total'] = time.perf_counter() - start
+    return timings
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+
+def summarize(samples):
+    summary = {}
+    for step in samples[0]:
+        values = [sample[step] * 1000 for sample in samples]
+        summary[step] = {
+            'p50_ms': round(percentile(values, 50), 2),
+            'p95_ms': round(percentile(values, 95), 2),
+            'p99_ms': round(percentile(values, 99), 2),
+            'mean_ms': round(statistics.fmean(values), 2),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Stripe stand-in and checkout flow load driver")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=12111)
+    serve.add_argument('--latency-ms', type=float, default=stub.config['LATENCY_MS'])
+    serve.add_argument('--webhook-url', default=stub.config['WEBHOOK_URL'],
+                       help="deliver checkout.session.completed here, e.g. http://127.0.0.1:5000/webhooks/stripe")
+    serve.add_argument('--webhook-secret', default=stub.config['WEBHOOK_SECRET'])
+    flow = commands.add_parser('flow')
+    flow.add_argument('--app-url', default='http://127.0.0.1:5000')
+    flow.add_argument('-n', '--requests', type=int, default=100)
+    flow.add_argument('-c', '--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        stub.config.update(LATENCY_MS=args.latency_ms, WEBHOOK_URL=args.webhook_url,
+                           WEBHOOK_SECRET=args.webhook_secret)
+        stub.run(host=args.host, port=args.port, threaded=True)
+        return
+
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        started = time.perf_counter()
+        samples = list(pool.map(lambda _: run_checkout_flow(args.app_url), range(args.requests)))
+        elapsed = time.perf_counter() - started
+    print(f"{args.requests} flows in {elapsed:.2f}s ({args.requests / elapsed:.1f} flows/s)")
+    for step, stats in summarize(samples).items():
+        print(f"{step:>20}: " + "  ".join(f"{name}={value}" for name, value in stats.items()))
+
+
+if __name__ == '__main__':
+    main()
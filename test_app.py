@@ -1,6 +1,41 @@
 import unittest
+import base64
 import json
-from app import app
+import gzip
+import hashlib
+import io
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import stripe
+from werkzeug.serving import make_server
+from app import app, create_report, get_report, render_report
+from report import PAGE1_LAYER, PAGE2_LAYER, render_profile
+from scoring import JDI8_ITEMS, SCORE_TABLE, score_answers, score_cohort, parse_answers
+from protocols import PROTOCOL_INDEX, select_protocol
+from stripe_stub import stub, sign_payload, webhook_event
+from benchmark import compare
+import metrics
+import bulk_reports
+import fulfillment
+import jobs
+import app as app_module
+
+def use_test_mode(test):
+    # /download-report and legacy /success links are only served with COMMERCIAL_READY off
+    patcher = mock.patch('app.COMMERCIAL_READY', False)
+    patcher.start()
+    test.addCleanup(patcher.stop)
 
 class TestJDI8(unittest.TestCase):
     def setUp(self):
@@ -56,5 +91,634 @@ class TestJDI8(unittest.TestCase):
         data = json.loads(response.data)
         self.assertEqual(data['score'], 4)
 
+class TestBulkScoring(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_json_array(self):
+        perfect = {item: True for item in JDI8_ITEMS}
+        perfect['beef_pork'] = False
+        payload = [perfect, {'beef_pork': True}, [True, True, True, False, False, False, False, False]]
+        response = self.app.post('/api/calculate_score/bulk', json=payload)
+        data = json.loads(response.data)
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(data['scores'], [8, 0, 4])
+        self.assertEqual(data['distribution'][8], 1)
+
+    def test_ndjson_stream(self):
+        body = '\n'.join(json.dumps({'rice': True, 'fish': bool(i % 2)}) for i in range(1000)) + '\n'
+        response = self.app.post('/api/calculate_score/bulk', data=body, content_type='application/x-ndjson')
+        data = json.loads(response.data)
+        self.assertEqual(data['count'], 1000)
+        self.assertEqual(data['distribution'][2], 500)
+        self.assertEqual(data['distribution'][3], 500)
+
+    def test_invalid_answer_rejected(self):
+        response = self.app.post('/api/calculate_score/bulk', json=[{'rice': 'yes'}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_cohort_matches_single_scoring(self):
+        packed = bytearray(range(256))
+        scores = score_cohort(packed)
+        for mask in range(256):
+            answers = [bool(mask >> bit & 1) for bit in range(8)]
+            self.assertEqual(scores[mask], score_answers(answers)['score'])
+
+class TestProtocolIndex(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        use_test_mode(self)
+        self.app.testing = True
+
+    def test_index_covers_every_answer_vector(self):
+        self.assertEqual(len(PROTOCOL_INDEX), 256)
+        for plan in PROTOCOL_INDEX:
+            self.assertEqual([row[0] for row in plan], ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'])
+
+    def test_plan_follows_missed_items(self):
+        no_seaweed = parse_answers('11011110')
+        perfect = parse_answers('11111110')
+        self.assertIn('Porphyranase', select_protocol(None, no_seaweed)[2][2])
+        self.assertNotEqual(select_protocol(None, no_seaweed), select_protocol(None, perfect))
+        self.assertEqual(select_protocol(None, perfect), select_protocol(8))
+
+    def test_api_returns_protocol(self):
+        response = self.app.post('/api/calculate_score', json={'rice': True, 'beef_pork': True})
+        data = json.loads(response.data)
+        self.assertEqual(data['answers'], '10000001')
+        self.assertEqual(len(data['protocol']), 7)
+        self.assertEqual(data['protocol'][0]['day'], 'Mon')
+
+    def test_download_by_answers(self):
+        response = self.app.get('/download-report?answers=10000001')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, create_report(None, parse_answers('10000001')).getvalue())
+        self.assertEqual(self.app.get('/download-report?answers=102').status_code, 400)
+
+class TestReportDownload(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        use_test_mode(self)
+        self.app.testing = True
+
+    def test_download_has_etag_and_length(self):
+        response = self.app.get('/download-report?score=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/pdf')
+        self.assertTrue(response.data.startswith(b'%PDF'))
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertIsNotNone(response.headers.get('ETag'))
+
+    def test_if_none_match_returns_304(self):
+        etag = self.app.get('/download-report?score=3').headers['ETag']
+        response = self.app.get('/download-report?score=3', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+
+    def test_cached_report_is_deterministic(self):
+        self.assertEqual(create_report(7).getvalue(), get_report(7)[0])
+
+    def test_static_layers_are_balanced(self):
+        for layer in (PAGE1_LAYER, PAGE2_LAYER):
+            self.assertTrue(layer.startswith('q'))
+            self.assertTrue(layer.endswith('Q'))
+        self.assertNotEqual(create_report(2).getvalue(), create_report(7).getvalue())
+
+    def test_invalid_scores_rejected(self):
+        for raw in ['9', '-1', 'abc', '3.5', '']:
+            response = self.app.get(f'/download-report?score={raw}')
+            self.assertEqual(response.status_code, 400, raw)
+
+class TestOutputProfiles(unittest.TestCase):
+    # Byte budgets per profile, checked across every score and the largest answer-vector variants
+    BUDGETS = {'standard': 4400, 'compact': 3800, 'png': 6 * 1024, 'webp': 4 * 1024}
+
+    def setUp(self):
+        self.app = app.test_client()
+        use_test_mode(self)
+
+    @staticmethod
+    def page_streams(pdf):
+        streams = []
+        for raw in re.findall(rb'stream\r?\n(.*?)endstream', pdf, re.S):
+            if b'ASCII85Decode' in pdf:
+                raw = base64.a85decode(raw.replace(b'\n', b'').strip().removesuffix(b'~>'))
+            streams.append(zlib.decompress(raw))
+        return streams
+
+    def test_profiles_fit_size_budget(self):
+        for profile, budget in self.BUDGETS.items():
+            for score in range(9):
+                size = len(render_profile(score, None, profile))
+                self.assertLessEqual(size, budget, f"{profile} score {score}: {size} bytes")
+        for answers in (0b11111110, 0b00000001, 0b10101010):
+            self.assertLessEqual(len(render_profile(None, answers, 'compact')), self.BUDGETS['compact'])
+
+    def test_compact_pdf_is_smaller_and_equivalent(self):
+        standard = create_report(5, 0b10110101).getvalue()
+        compact = create_report(5, 0b10110101, profile='compact').getvalue()
+        self.assertLess(len(compact), len(standard) * 0.9)
+        self.assertNotIn(b'ASCII85Decode', compact)
+        self.assertEqual(self.page_streams(compact), self.page_streams(standard))
+
+    def test_download_profile_and_preview_routes(self):
+        response = self.app.get('/download-report?answers=10110101&profile=compact')
+        self.assertEqual(response.data, render_profile(None, parse_answers('10110101'), 'compact'))
+        self.assertEqual(self.app.get('/download-report?score=5&profile=huge').status_code, 400)
+
+        png = self.app.get('/report-preview?score=6', headers={'Accept': 'image/png'})
+        self.assertEqual(png.mimetype, 'image/png')
+        self.assertIn('Accept', png.headers['Vary'])
+        self.assertEqual(Image.open(io.BytesIO(png.data)).size, (596, 362))
+        webp = self.app.get('/report-preview?answers=11110000&format=webp')
+        self.assertEqual(webp.mimetype, 'image/webp')
+        self.assertEqual(webp.data, render_profile(SCORE_TABLE[parse_answers('11110000')], None, 'webp'))
+
+class TestReportStreaming(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        use_test_mode(self)
+        self.app.testing = True
+
+    def assert_range_support(self):
+        full = self.app.get('/download-report?score=6')
+        self.assertEqual(full.headers['Accept-Ranges'], 'bytes')
+        partial = self.app.get('/download-report?score=6', headers={'Range': 'bytes=100-199'})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.data, full.data[100:200])
+        self.assertEqual(partial.headers['Content-Range'], f'bytes 100-199/{len(full.data)}')
+        return full
+
+    def test_memory_cache_range(self):
+        self.assert_range_support()
+
+    def test_disk_cache_streams_file(self):
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch('app.REPORT_CACHE_DIR', cache_dir), mock.patch.dict('app._report_cache', clear=True):
+            full = self.assert_range_support()
+            self.assertEqual(full.data, create_report(6).getvalue())
+            etag = full.headers['ETag']
+            self.assertEqual(self.app.get('/download-report?score=6', headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_concurrent_disk_writes_keep_etag(self):
+        data = create_report(6).getvalue()
+        barrier = threading.Barrier(8)
+
+        def render(score, answers, profile):
+            barrier.wait(5)  # every thread writes the cache file at the same moment, as single-flight waiters do
+            return data
+
+        with tempfile.TemporaryDirectory() as cache_dir, ThreadPoolExecutor(8) as threads, \
+                mock.patch('app.REPORT_CACHE_DIR', cache_dir), mock.patch.dict('app._report_cache', clear=True):
+            entries = list(threads.map(lambda _: app_module._report_entry(6, render=render), range(8)))
+            with open(entries[0][2], 'rb') as f:
+                self.assertEqual(f.read(), data)
+        for cached, etag, _ in entries:
+            self.assertIsNone(cached)
+            self.assertEqual(etag, hashlib.sha256(data).hexdigest()[:32])
+
+class TestRenderPool(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        use_test_mode(self)
+        self.app.testing = True
+
+    def test_process_pool_render(self):
+        with mock.patch('app.RENDER_WORKERS', 1):
+            self.assertEqual(render_report(4), create_report(4).getvalue())
+
+    def test_dead_render_process_replaces_pool(self):
+        with mock.patch('app.RENDER_WORKERS', 1):
+            render_report(4)
+            broken = app_module._render_pool
+            for process in list(broken._processes.values()):
+                os.kill(process.pid, signal.SIGKILL)
+                process.join(5)
+            # The first render after the crash sees the broken pool, replaces it and retries
+            self.assertEqual(render_report(6), create_report(6).getvalue())
+            self.assertIsNot(app_module._render_pool, broken)
+            with mock.patch.dict('app._report_cache', clear=True):
+                self.assertEqual(self.app.get('/download-report?score=2').status_code, 200)
+
+    def test_queue_full_sheds_load(self):
+        with mock.patch('app.RENDER_WORKERS', 1), mock.patch('app.RENDER_QUEUE_DEPTH', 0), \
+                mock.patch.dict('app._report_cache', clear=True):
+            response = self.app.get('/download-report?score=2')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '5')
+
+    def test_identical_renders_single_flight(self):
+        calls = []
+        release = threading.Event()
+
+        def slow_render(score, answers=None, profile='standard'):
+            calls.append(score)
+            release.wait(5)
+            return b'%PDF-stub'
+
+        with ThreadPoolExecutor(4) as pool, ThreadPoolExecutor(4) as clients, \
+                mock.patch('app.RENDER_WORKERS', 1), mock.patch('app._render_pdf', slow_render), \
+                mock.patch('app._get_render_pool', return_value=pool):
+            results = [clients.submit(render_report, 3) for _ in range(4)]
+            # Give every client time to join the in-flight render before it completes
+            time.sleep(0.2)
+            release.set()
+            self.assertEqual([f.result() for f in results], [b'%PDF-stub'] * 4)
+        self.assertEqual(calls, [3])
+
+class TestCheckoutFlow(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = make_server('127.0.0.1', 0, stub, threaded=True)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.api_base = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.app = app.test_client()
+        self.app.testing = True
+
+    def test_checkout_against_stub(self):
+        with mock.patch.object(stripe, 'api_base', self.api_base):
+            response = self.app.post('/create-checkout-session', data={'answers': '11111110', 'score': '8'})
+        self.assertEqual(response.status_code, 303)
+        pay_url = response.headers['Location']
+        self.assertTrue(pay_url.startswith(self.api_base + '/pay/cs_test_'))
+
+        session_id = pay_url.rsplit('/', 1)[1]
+        self.assertEqual(stub.test_client().get(f'/v1/checkout/sessions/{session_id}').get_json()['metadata'],
+                         {'answers': '11111110'})
+
+        paid = stub.test_client().get(pay_url[len(self.api_base):])
+        self.assertEqual(paid.status_code, 303)
+        self.assertTrue(paid.headers['Location'].endswith(f'/success?session_id={session_id}'))
+
+    def test_stripe_unreachable_returns_503(self):
+        with mock.patch.object(stripe, 'api_base', 'http://127.0.0.1:9'), mock.patch.object(stripe, 'max_network_retries', 0):
+            response = self.app.post('/create-checkout-session', data={'score': '3'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response.headers)
+
+class TestFulfillment(unittest.TestCase):
+    SECRET = 'whsec_test'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = make_server('127.0.0.1', 0, stub, threaded=True)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_base = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.app = app.test_client()
+        store_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(store_dir.cleanup)
+        for patcher in (mock.patch('app.fulfillment_store', fulfillment.BlobStore(store_dir.name)),
+                        mock.patch('app.STRIPE_WEBHOOK_SECRET', self.SECRET),
+                        mock.patch.object(stripe, 'api_base', self.api_base)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def checkout(self, answers):
+        response = self.app.post('/create-checkout-session', data={'answers': answers})
+        return response.headers['Location'].rsplit('/', 1)[1]
+
+    def download_url(self, session_id):
+        html = self.app.get(f'/success?session_id={session_id}').data.decode()
+        return re.search(r'href="(/reports/[^"]+)"', html).group(1)
+
+    def post_event(self, payload, secret=SECRET):
+        return self.app.post('/webhooks/stripe', data=payload, content_type='application/json',
+                             headers={'Stripe-Signature': sign_payload(payload, secret)})
+
+    def test_tokens_are_signed_and_expire(self):
+        token = fulfillment.sign_token('cs_test_abc', ttl=60, now=1000)
+        self.assertEqual(fulfillment.verify_token(token, now=1030), 'cs_test_abc')
+        self.assertIsNone(fulfillment.verify_token(token, now=1061))
+        self.assertIsNone(fulfillment.verify_token(token.replace('cs_test_abc', 'cs_test_abd'), now=1030))
+        self.assertIsNone(fulfillment.verify_token('garbage', now=1030))
+
+    def test_non_ascii_token_is_not_found(self):
+        self.assertIsNone(fulfillment.verify_token('cs_test_x.9999999999.\u00e9\u00e9'))
+        self.assertEqual(self.app.get('/reports/cs_test_x.9999999999.%C3%A9%C3%A9').status_code, 404)
+
+    def test_webhook_prerenders_report(self):
+        session_id = self.checkout('11111110')
+        session = dict(stub.test_client().get(f'/v1/checkout/sessions/{session_id}').get_json(),
+                       payment_status='paid')
+        response = self.post_event(webhook_event('checkout.session.completed', session))
+        self.assertEqual(response.status_code, 200)
+        app_module._inflight_fulfillments.get(session_id, mock.Mock()).result(timeout=30)
+        self.assertIsNotNone(app_module.fulfillment_store.lookup(session_id))
+
+        download = self.app.get(self.download_url(session_id))
+        self.assertEqual(download.status_code, 200)
+        self.assertEqual(download.data, get_report(8, 0b01111111)[0])
+
+    def test_webhook_rejects_bad_signature(self):
+        payload = webhook_event('checkout.session.completed', {'id': 'cs_test_x', 'payment_status': 'paid'})
+        self.assertEqual(self.post_event(payload, secret='whsec_wrong').status_code, 400)
+
+    def test_query_string_downloads_need_test_mode(self):
+        with mock.patch('app.COMMERCIAL_READY', True):
+            self.assertEqual(self.app.get('/download-report?answers=11111110').status_code, 404)
+            self.assertEqual(self.app.get('/success?answers=11111110').status_code, 404)
+            self.assertEqual(self.app.get('/success?score=8').status_code, 404)
+
+    def test_success_signs_only_paid_sessions(self):
+        session_id = self.checkout('00000001')
+        pending = self.app.get(f'/success?session_id={session_id}').data.decode()
+        self.assertNotIn('/reports/', pending)
+        self.assertIn(f'/success?session_id={session_id}', pending)
+        unknown = self.app.get('/success?session_id=cs_anything_i_want')
+        self.assertEqual(unknown.status_code, 404)
+        # A link signed for a session that never paid still cannot download
+        self.assertEqual(self.app.get(f'/reports/{fulfillment.sign_token(session_id)}').status_code, 402)
+
+    def test_download_without_webhook_checks_payment(self):
+        session_id = self.checkout('00000001')
+        stub.test_client().get(f'/pay/{session_id}')
+        url = self.download_url(session_id)
+        download = self.app.get(url)
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(download.data.startswith(b'%PDF'))
+        self.assertEqual(self.app.get(url[:-4] + 'AAAA').status_code, 404)
+
+    def test_accel_redirect_and_sweep(self):
+        session_id = self.checkout('10000000')
+        stub.test_client().get(f'/pay/{session_id}')
+        with mock.patch('app.FULFILLMENT_ACCEL_PREFIX', '/protected-reports/'):
+            response = self.app.get(self.download_url(session_id))
+        self.assertEqual(response.headers['X-Accel-Redirect'], f'/protected-reports/{session_id}.pdf')
+        self.assertEqual(response.data, b'')
+        store = app_module.fulfillment_store
+        self.assertEqual(store.sweep(now=time.time() + store.ttl + 1), 1)
+        self.assertIsNone(store.lookup(session_id))
+
+class TestReportJobs(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        jobs_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(jobs_dir.cleanup)
+        self.queue = jobs.JobQueue(jobs_dir.name, limit=2)
+        self.runner = jobs.JobRunner(self.queue, app_module._run_report_job, retry_on=(app_module.RenderQueueFull,))
+        self.addCleanup(self.runner.stop)
+        for patcher in (mock.patch('app.report_jobs', self.queue), mock.patch('app.job_runner', self.runner)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def wait(self, status_url, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = self.app.get(status_url).get_json()
+            if status['status'] in ('done', 'failed'):
+                return status
+            time.sleep(0.05)
+        self.fail(f"job did not finish: {status}")
+
+    def test_submit_poll_and_fetch(self):
+        response = self.app.post('/api/reports', json={'answers': '10110101', 'profile': 'compact'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.headers['Location'], response.get_json()['status_url'])
+        status = self.wait(response.headers['Location'])
+        self.assertEqual(status['status'], 'done')
+        result = self.app.get(status['result_url'])
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.mimetype, 'application/pdf')
+        self.assertEqual(result.data, get_report(None, parse_answers('10110101'), profile='compact')[0])
+
+    def test_rejects_bad_input_and_unknown_ids(self):
+        self.assertEqual(self.app.post('/api/reports', json={'answers': '1011'}).status_code, 400)
+        self.assertEqual(self.app.post('/api/reports', json={'score': 3, 'profile': 'tiff'}).status_code, 400)
+        self.assertEqual(self.app.get('/api/reports/job_' + '0' * 24).status_code, 404)
+        self.assertEqual(self.app.get('/api/reports/../etc').status_code, 404)
+
+    def test_backpressure_requeue_and_expiry(self):
+        with mock.patch.object(self.runner, 'start'):
+            first = self.app.post('/api/reports', json={'score': 4}).get_json()
+            self.app.post('/api/reports', json={'score': 5})
+            full = self.app.post('/api/reports', json={'score': 6})
+            self.assertEqual(full.status_code, 503)
+            self.assertIn('Retry-After', full.headers)
+            self.assertEqual(self.app.get(first['status_url'] + '/result').status_code, 409)
+
+        # A job held by a worker that died goes back to the queue
+        job = self.queue.claim()
+        self.queue._write('running', dict(job, pid=2 ** 22 + 1))
+        self.assertEqual(self.queue.sweep(), 1)
+        self.assertEqual(self.queue.get(job['id'])['status'], 'queued')
+
+        self.runner.start()
+        status = self.wait(first['status_url'])
+        self.assertEqual(status['status'], 'done')
+        self.queue.sweep(now=status['finished'] + self.queue.ttl + 1)
+        self.assertEqual(self.app.get(first['status_url']).status_code, 404)
+
+    def test_claim_window_and_attempt_cap(self):
+        job = self.queue.submit({'score': 2, 'answers': None, 'profile': 'standard', 'ext': 'pdf'})
+        # Queued for longer than the claim grace, then swept mid-claim (renamed into running/, pid not yet
+        # written): the sweeper must still leave it alone
+        queued_at = time.time() - jobs.JOB_CLAIM_GRACE * 2
+        os.utime(self.queue._path('queued', job['id']), (queued_at, queued_at))
+        write = self.queue._write
+        swept = []
+
+        def write_after_sweep(state, claimed):
+            if state == 'running' and not swept:
+                swept.append(self.queue.sweep())
+                self.assertEqual(self.queue.get(claimed['id'])['status'], 'running')
+            write(state, claimed)
+
+        with mock.patch.object(self.queue, '_write', write_after_sweep):
+            claimed = self.queue.claim()
+        self.assertEqual((claimed['id'], swept), (job['id'], [0]))
+
+        busy = mock.Mock(side_effect=app_module.RenderQueueFull())
+        runner = jobs.JobRunner(self.queue, busy, retry_on=(app_module.RenderQueueFull,), workers=1)
+        self.queue.requeue(self.queue.get(job['id']), "stuck")
+        with mock.patch('jobs.JOB_POLL_INTERVAL', 0):
+            for _ in range(self.queue.max_attempts):
+                runner._step()
+        status = self.queue.get(job['id'])
+        self.assertEqual(status['status'], 'failed')
+        self.assertIn('gave up after 5 attempts', status['error'])
+
+    def test_runner_survives_errors(self):
+        sweeps = []
+
+        def flaky_sweep():
+            sweeps.append(1)
+            if len(sweeps) == 1:
+                raise KeyError('pid')
+            return 0
+
+        with mock.patch.object(self.queue, 'sweep', side_effect=flaky_sweep), \
+                mock.patch('jobs.JOB_SWEEP_INTERVAL', 0), self.assertLogs('jobs', 'ERROR'):
+            self.runner.start()
+            status = self.wait(self.app.post('/api/reports', json={'score': 1}).headers['Location'])
+        self.assertEqual(status['status'], 'done')
+
+class TestCompiledPages(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        use_test_mode(self)
+        self.app.testing = True
+
+    def test_home_negotiates_encoding(self):
+        plain = self.app.get('/')
+        self.assertIsNone(plain.headers.get('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+        zipped = self.app.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(zipped.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(zipped.data), plain.data)
+        self.assertNotEqual(zipped.headers['ETag'], plain.headers['ETag'])
+        self.assertEqual(self.app.get('/', headers={'If-None-Match': plain.headers['ETag']}).status_code, 304)
+
+    def test_assets_are_hashed_and_immutable(self):
+        html = self.app.get('/').data.decode()
+        urls = re.findall(r'/assets/zengen\.[0-9a-f]{12}\.(?:css|js)', html)
+        self.assertEqual(len(urls), 2)
+        for url in urls:
+            response = self.app.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertEqual(self.app.get('/assets/zengen.000000000000.css').status_code, 404)
+
+    def test_asset_served_before_any_page(self):
+        url = app_module.asset_url('js/zengen.js')
+        with mock.patch.dict('app._assets', clear=True), mock.patch.dict('app._asset_urls', clear=True):
+            response = self.app.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'text/javascript')
+
+    def test_success_links_validated_report(self):
+        html = self.app.get('/success?score=<script>').data.decode()
+        self.assertIn('/download-report?score=0', html)
+        html = self.app.get('/success?answers=10101010').data.decode()
+        self.assertIn('/download-report?answers=10101010', html)
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.app = app.test_client()
+        use_test_mode(self)
+        self.app.testing = True
+
+    def test_route_latency_and_render_phases(self):
+        self.app.get('/about')
+        with mock.patch.dict('app._report_cache', clear=True):
+            self.app.get('/download-report?score=1')
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.data.decode()
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/about",status="200"}', body)
+        self.assertIn('http_requests_in_flight{route="/about"} 0', body)
+        self.assertIn('report_render_phase_seconds_count{phase="table"}', body)
+        self.assertIn('report_cache_lookups_total{result="miss"}', body)
+
+    def test_snapshots_merge_across_processes(self):
+        dead_pid = 2 ** 22 + 12345
+        snapshot = [['stripe_errors_total', [['type', 'CardError']], 3],
+                    ['http_requests_in_flight', [['route', '/']], 7]]
+        with tempfile.TemporaryDirectory() as metrics_dir, mock.patch('metrics.METRICS_DIR', metrics_dir):
+            with open(os.path.join(metrics_dir, f'metrics_{dead_pid}.json'), 'w') as f:
+                json.dump(snapshot, f)
+            body = metrics.render_prometheus()
+            # The dead pid's counters now live in the retired totals and are not counted twice
+            self.assertEqual(sorted(os.listdir(metrics_dir)),
+                             ['.lock', f'metrics_{os.getpid()}.json', 'metrics_retired.json'])
+            self.assertIn('stripe_errors_total{type="CardError"} 3', metrics.render_prometheus())
+        self.assertIn('stripe_errors_total{type="CardError"} 3', body)
+        self.assertNotIn('http_requests_in_flight{route="/"} 7', body)
+
+    def test_reused_pid_keeps_predecessor_counters(self):
+        with tempfile.TemporaryDirectory() as metrics_dir, mock.patch('metrics.METRICS_DIR', metrics_dir), \
+                mock.patch('metrics._snapshot_pid', None):
+            with open(os.path.join(metrics_dir, f'metrics_{os.getpid()}.json'), 'w') as f:
+                json.dump([['stripe_errors_total', [['type', 'RateLimitError']], 2]], f)
+            body = metrics.render_prometheus()
+        self.assertIn('stripe_errors_total{type="RateLimitError"} 2', body)
+
+class TestBenchmarkCompare(unittest.TestCase):
+    def test_flags_regressions_by_direction(self):
+        baseline = {'metrics': {'render.score_1.renders_per_s': 100, 'route.home.p50_ms': 10,
+                                'route.home.p99_ms': 10, 'load.home.errors': 0}}
+        current = {'render.score_1.renders_per_s': 60, 'route.home.p50_ms': 20,
+                   'route.home.p99_ms': 50, 'load.home.errors': 2}
+        regressions = compare(current, baseline, 0.3)
+        self.assertEqual(len(regressions), 3)
+        self.assertFalse(any('p99' in line for line in regressions))
+        self.assertEqual(compare(baseline['metrics'], baseline, 0.3), [])
+
+class TestBulkReports(unittest.TestCase):
+    CSV = ("id,rice,miso_soup,seaweed,pickles,green_yellow_veg,fish,green_tea,beef_pork\n"
+           "clinic-1,yes,yes,no,no,yes,yes,yes,no\n"
+           "clinic-2,0,0,0,0,0,0,0,1\n"
+           "clinic-1,x,x,x,x,x,x,x,\n")
+
+    def setUp(self):
+        self.client = app.test_client()
+
+    def test_csv_rows_become_answer_masks(self):
+        records = bulk_reports.open_records(io.BytesIO(self.CSV.encode()), 'csv')
+        respondents = list(bulk_reports.read_respondents(records))
+        self.assertEqual([rid for rid, _ in respondents], ['clinic-1', 'clinic-2', 'clinic-1'])
+        self.assertEqual([SCORE_TABLE[mask] for _, mask in respondents], [6, 0, 8])
+
+    def test_archive_renders_each_vector_once_and_keeps_order(self):
+        renders = []
+        def render(mask):
+            renders.append(mask)
+            return b'%PDF-' + bytes([mask])
+        respondents = [('a', 3), ('b', 5), ('c', 3), ('a', 3)]
+        buffer = io.BytesIO()
+        count = bulk_reports.write_zip(bulk_reports.iter_reports(respondents, render=render), buffer)
+        self.assertEqual(count, 4)
+        self.assertEqual(sorted(renders), [3, 5])
+        with zipfile.ZipFile(buffer) as archive:
+            self.assertEqual(archive.namelist(), ['a.pdf', 'b.pdf', 'c.pdf', 'a_2.pdf', 'manifest.csv'])
+            self.assertEqual(archive.read('c.pdf'), b'%PDF-\x03')
+
+    def test_endpoint_streams_zip(self):
+        response = self.client.post('/api/reports/bulk', data=self.CSV, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/zip')
+        self.assertTrue(response.is_streamed)
+        with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+            self.assertTrue(archive.read('clinic-2.pdf').startswith(b'%PDF'))
+            manifest = archive.read('manifest.csv').decode().splitlines()
+        self.assertEqual(manifest[1], 'clinic-1,clinic-1.pdf,11001110,6,High (14% lower mortality risk)')
+
+    def test_endpoint_rejects_bad_rows(self):
+        bad = self.CSV.replace('clinic-2,0', 'clinic-2,maybe')
+        response = self.client.post('/api/reports/bulk', data=bad, content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('line 3: rice', response.get_json()['error'])
+        oversized = self.CSV.replace('clinic-2', 'x' * 200000)
+        response = self.client.post('/api/reports/bulk', data=oversized, content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('line 3: field larger than field limit', response.get_json()['error'])
+
+class TestColdStart(unittest.TestCase):
+    def test_import_defers_heavy_dependencies(self):
+        probe = "import sys, app; print(sorted(m for m in ('reportlab', 'stripe', 'report') if m in sys.modules))"
+        env = dict(os.environ, REPORT_CACHE_WARM='0')
+        output = subprocess.run([sys.executable, '-c', probe], env=env, capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        self.assertEqual(output.strip().splitlines()[-1], '[]')
+
+    def test_warm_up_fills_caches(self):
+        import app as app_module
+        app_module.warm_up()
+        self.assertIn((app_module.REPORT_VERSION, 5, None, 'standard'), app_module._report_cache)
+        self.assertIn(('home', app_module.COMMERCIAL_READY), app_module._compiled_pages)
+
 if __name__ == '__main__':
     unittest.main()